@@ -0,0 +1,172 @@
+import os
+import sys
+import csv
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+import statistics
+from time import perf_counter
+
+from DATA_200_LAB_1 import CheckMyGradeApp, Grades, PasswordHasher
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+OPERATIONS = ("load_all", "save_students", "save_courses", "save_profs", "save_users", "search_students",
+              "sort_students", "course_stats", "report_course_full", "login", "startup_eager", "startup_lazy")
+STARTUP_SCRIPT = """
+import sys
+from DATA_200_LAB_1 import CheckMyGradeApp, PasswordHasher
+PasswordHasher.PBKDF2_ITERATIONS = 1
+app = CheckMyGradeApp(sys.argv[1], lazy=sys.argv[2] == "lazy")
+user = app.login(sys.argv[3], "x")
+print(app.report_student(user.User_id))
+"""
+MEMORY_SCRIPT = """
+import sys, resource
+from DATA_200_LAB_1 import CheckMyGradeApp
+CheckMyGradeApp(sys.argv[1]).load_all()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(rss / 2**20 if sys.platform == "darwin" else rss / 2**10)
+"""
+
+def generate_roster(data_dir, n_students, n_courses=200, seed=200):
+    rnd = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    courses = [f"DATA{100 + i}" for i in range(n_courses)]
+    with open(os.path.join(data_dir, "Student.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["Email_address", "First_name", "Last_name", "Course_id", "grades", "Marks"])
+        for i in range(n_students):
+            marks = rnd.randint(0, 100)
+            w.writerow([f"student{i}@sjsu.edu", f"First{i}", f"Last{i % 5000}", rnd.choice(courses), Grades.letter_for(marks), marks])
+    with open(os.path.join(data_dir, "Course.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["Course_id", "Course_name", "Description", "Credits"])
+        for cid in courses:
+            w.writerow([cid, f"Course {cid}", "Generated course", 3])
+    with open(os.path.join(data_dir, "Professor.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["Professor_id", "Professor_Name", "Rank", "Course_id"])
+        for i, cid in enumerate(courses):
+            w.writerow([f"prof{i}@sjsu.edu", f"Professor {i}", "Professor", cid])
+    with open(os.path.join(data_dir, "Login.csv"), "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["User_id", "Password", "Role"])
+        w.writerow(["bench@sjsu.edu", PasswordHasher.hash_password("bench-pass"), "professor"])
+        for i in range(min(n_students, 10_000)):
+            w.writerow([f"student{i}@sjsu.edu", PasswordHasher.hash_password("x", work=1), "student"])
+    return courses
+
+def time_op(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        samples.append((perf_counter() - t0) * 1000.0)
+    return {"min_ms": min(samples), "median_ms": statistics.median(samples),
+            "mean_ms": statistics.fmean(samples), "runs": repeat}
+
+def run_startup(data_dir, mode, email):
+    subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, data_dir, mode, email], check=True, stdout=subprocess.DEVNULL,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def peak_rss_mb(data_dir):
+    try:
+        import resource
+    except ImportError:
+        return None
+    out = subprocess.run([sys.executable, "-c", MEMORY_SCRIPT, data_dir], check=True, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    return round(float(out.stdout.strip().splitlines()[-1]), 1)
+
+def bench_size(n_students, n_courses=200, repeat=5, warmup=1):
+    with tempfile.TemporaryDirectory() as d:
+        courses = generate_roster(d, n_students, n_courses)
+        app = CheckMyGradeApp(d)
+        cid = courses[len(courses) // 2]
+        email = f"student{min(n_students, 10_000) // 2}@sjsu.edu"
+        ops = {
+            "load_all": app.load_all,
+            "save_students": app.save_students,
+            "save_courses": app.save_courses,
+            "save_profs": app.save_profs,
+            "save_users": app.save_users,
+            "search_students": lambda: app.search_students(f"student{n_students // 2}"),
+            "sort_students": lambda: app.sort_students("marks", True, 0, 20),
+            "course_stats": lambda: app.course_stats(cid),
+            "report_course_full": lambda: (app.report_cache.clear(), app.report_course_full(cid)),
+            "login": lambda: app.login("bench@sjsu.edu", "bench-pass"),
+            "startup_eager": lambda: run_startup(d, "eager", email),
+            "startup_lazy": lambda: run_startup(d, "lazy", email),
+        }
+        out = {}
+        for name in OPERATIONS:
+            out[name] = time_op(ops[name], repeat, warmup)
+            print(f"[{n_students:>9}] {name:<20} median {out[name]['median_ms']:10.2f} ms  min {out[name]['min_ms']:10.2f} ms")
+        app.auth.shutdown()
+        rss = peak_rss_mb(d)
+        if rss is not None:
+            print(f"[{n_students:>9}] {'peak_rss_load_all':<20} {rss:10.1f} MB")
+        return out, rss
+
+def run_benchmarks(sizes=DEFAULT_SIZES, n_courses=200, repeat=5, warmup=1):
+    results, memory = {}, {}
+    for n in sizes:
+        results[str(n)], memory[str(n)] = bench_size(n, n_courses, repeat, warmup)
+    return {"python": sys.version.split()[0], "repeat": repeat, "warmup": warmup,
+            "results": results, "peak_rss_mb": memory}
+
+def compare(results, baseline, tolerance=0.25, floor_ms=1.0, floor_mb=5.0):
+    regressions = []
+    for size, cur in results.get("peak_rss_mb", {}).items():
+        base = baseline.get("peak_rss_mb", {}).get(size)
+        if cur is None or base is None:
+            continue
+        limit = base * (1 + tolerance)
+        if cur > limit and cur - base > floor_mb:
+            regressions.append(f"{size} peak_rss_load_all: {cur:.1f} MB > {limit:.1f} MB (baseline {base:.1f} MB)")
+    for size, ops in results["results"].items():
+        for name, cur in ops.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            limit = base["median_ms"] * (1 + tolerance)
+            if cur["median_ms"] > limit and cur["median_ms"] - base["median_ms"] > floor_ms:
+                regressions.append(f"{size} {name}: {cur['median_ms']:.2f} ms > {limit:.2f} ms (baseline {base['median_ms']:.2f} ms)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CheckMyGrade benchmark suite")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="comma separated roster sizes")
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline median")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+    sizes = [int(n) for n in args.sizes.split(",") if n]
+    results = run_benchmarks(sizes, args.courses, args.repeat, args.warmup)
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
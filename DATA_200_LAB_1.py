@@ -1,14 +1,119 @@
-import os, csv, hashlib, getpass, statistics, time
-from dataclasses import dataclass, asdict
-from typing import Dict, List, Optional
+import os, io, sys, csv, json, functools, itertools, math, atexit, time, bisect, heapq, threading
+from dataclasses import dataclass, asdict, replace
+from contextlib import ExitStack, asynccontextmanager, contextmanager, nullcontext
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+from collections import Counter, OrderedDict, deque, namedtuple
+from collections.abc import MutableMapping, Sequence as SequenceABC
+from array import array
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 class PasswordHasher:
+    ALGORITHM = "pbkdf2_sha256"
+    PBKDF2_ITERATIONS = 100_000
+    SCRYPT_N = 2 ** 14
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    @classmethod
+    def hash_password(cls, plaintext: str, algorithm: Optional[str] = None, work: Optional[int] = None):
+        import hashlib
+        algorithm = algorithm or cls.ALGORITHM
+        salt = os.urandom(16)
+        if algorithm == "scrypt":
+            n = work or cls.SCRYPT_N
+            dk = cls._scrypt(plaintext, salt, n, cls.SCRYPT_R, cls.SCRYPT_P)
+            return f"scrypt${n}${cls.SCRYPT_R}${cls.SCRYPT_P}${salt.hex()}${dk.hex()}"
+        iterations = work or cls.PBKDF2_ITERATIONS
+        dk = hashlib.pbkdf2_hmac("sha256", plaintext.encode("utf-8"), salt, iterations)
+        return f"pbkdf2_sha256${iterations}${salt.hex()}${dk.hex()}"
+    @classmethod
+    def verify_password(cls, plaintext: str, hashed: str):
+        import hashlib, hmac
+        parts = hashed.split("$")
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            dk = hashlib.pbkdf2_hmac("sha256", plaintext.encode("utf-8"), bytes.fromhex(parts[2]), int(parts[1]))
+            return hmac.compare_digest(dk.hex(), parts[3])
+        if parts[0] == "scrypt" and len(parts) == 6:
+            dk = cls._scrypt(plaintext, bytes.fromhex(parts[4]), int(parts[1]), int(parts[2]), int(parts[3]))
+            return hmac.compare_digest(dk.hex(), parts[5])
+        return hmac.compare_digest(hashlib.sha256(plaintext.encode("utf-8")).hexdigest(), hashed)
+    @classmethod
+    def needs_rehash(cls, hashed: str):
+        parts = hashed.split("$")
+        if parts[0] != cls.ALGORITHM:
+            return True
+        if parts[0] == "scrypt":
+            return int(parts[1]) != cls.SCRYPT_N
+        return int(parts[1]) != cls.PBKDF2_ITERATIONS
     @staticmethod
-    def hash_password(plaintext: str):
-        return hashlib.sha256(plaintext.encode("utf-8")).hexdigest()
-    @staticmethod
-    def verify_password(plaintext: str, hashed: str):
-        return hashlib.sha256(plaintext.encode("utf-8")).hexdigest() == hashed
+    def _scrypt(plaintext: str, salt: bytes, n: int, r: int, p: int):
+        import hashlib
+        return hashlib.scrypt(plaintext.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n * p + 2 ** 20)
+
+class Authenticator:
+    SESSION_TTL = 15 * 60
+    def __init__(self, lookup, workers: int = 4, processes: bool = False, session_ttl: Optional[float] = None):
+        self.lookup = lookup
+        self.workers = workers
+        self.processes = processes
+        self.session_ttl = self.SESSION_TTL if session_ttl is None else session_ttl
+        self.sessions: Dict[str, tuple] = {}
+        self._expiry: List[tuple] = []
+        self._pool = None
+    def executor(self):
+        if self._pool is None:
+            if self.processes:
+                from concurrent.futures import ProcessPoolExecutor
+                self._pool = ProcessPoolExecutor(self.workers)
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                self._pool = ThreadPoolExecutor(self.workers)
+        return self._pool
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+    def verify_async(self, email: str, password: str) -> "Future":
+        from concurrent.futures import Future
+        out: Future = Future()
+        u = self.lookup(email)
+        if u is None:
+            out.set_result(None)
+            return out
+        def done(f: Future):
+            if f.exception() is not None:
+                out.set_exception(f.exception())
+            else:
+                out.set_result(u if f.result() else None)
+        self.executor().submit(PasswordHasher.verify_password, password, u.Password).add_done_callback(done)
+        return out
+    def verify(self, email: str, password: str):
+        return self.verify_async(email, password).result()
+    def open_session(self, user) -> str:
+        import secrets
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] < now:
+            t = heapq.heappop(self._expiry)[1]
+            entry = self.sessions.get(t)
+            if entry is not None and entry[1] < now:
+                del self.sessions[t]
+        self.sessions[token] = (user.User_id, now + self.session_ttl)
+        heapq.heappush(self._expiry, (now + self.session_ttl, token))
+        return token
+    def session(self, token: str):
+        entry = self.sessions.get(token)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self.sessions.pop(token, None)
+            return None
+        return self.lookup(entry[0])
+    def close_session(self, token: str):
+        self.sessions.pop(token, None)
 
 @dataclass
 class Course:
@@ -41,62 +146,1561 @@ class LoginUser:
 
 class Grades:
     SCALE = [(90, "A+"), (80, "A"), (71, "B"), (61, "C"), (51, "D"), (0, "F")]
+    _thresholds: tuple = ((), (), ())
     @classmethod
     def letter_for(cls, marks: int):
         for low, letter in cls.SCALE:
             if marks >= low:
                 return letter
         return "F"
+    @classmethod
+    def thresholds(cls):
+        scale = tuple(cls.SCALE)
+        if cls._thresholds[0] != scale:
+            ordered = sorted(scale)
+            cls._thresholds = (scale, [low for low, _ in ordered], [letter for _, letter in ordered])
+        return cls._thresholds[1], cls._thresholds[2]
+    @classmethod
+    def letters_for(cls, marks: Iterable[int]) -> List[str]:
+        lows, letters = cls.thresholds()
+        marks = list(marks)
+        memo = {}
+        for m in set(marks):
+            i = bisect.bisect_right(lows, m) - 1
+            memo[m] = letters[i] if i >= 0 else "F"
+        return [memo[m] for m in marks]
+
+class Histogram:
+    BOUNDS = [1e-6 * 2 ** (i / 4) for i in range(108)]
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(self.BOUNDS[i] if i < len(self.BOUNDS) else self.max, self.max)
+        return self.max
+
+class OpMetrics:
+    def __init__(self):
+        self.latency = Histogram()
+        self.calls = 0
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+    def snapshot(self) -> Dict:
+        h = self.latency
+        return {"calls": self.calls, "timed": h.count, "total_ms": h.total * 1000.0,
+                "mean_ms": h.total * 1000.0 / h.count if h.count else 0.0,
+                "p50_ms": h.percentile(0.50) * 1000.0, "p95_ms": h.percentile(0.95) * 1000.0,
+                "p99_ms": h.percentile(0.99) * 1000.0, "max_ms": h.max * 1000.0,
+                "rows": self.rows, "bytes_read": self.bytes_read, "bytes_written": self.bytes_written}
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.ops: Dict[str, OpMetrics] = {}
+        self._lock = threading.Lock()
+        self._patched: List[tuple] = []
+    def _op(self, name: str) -> OpMetrics:
+        op = self.ops.get(name)
+        if op is None:
+            op = self.ops.setdefault(name, OpMetrics())
+        return op
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            op = self._op(name)
+            op.calls += 1
+            op.latency.add(seconds)
+    def count(self, name: str, rows: int = 0, bytes_read: int = 0, bytes_written: int = 0):
+        with self._lock:
+            op = self._op(name)
+            op.rows += rows
+            op.bytes_read += bytes_read
+            op.bytes_written += bytes_written
+    def timed(self, name: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - t0)
+        return wrapper
+    def enable(self, *classes):
+        if self.enabled:
+            return
+        for cls in classes or (CheckMyGradeApp, CSVstore, SQLiteStore):
+            for attr in cls.METRICS_OPS:
+                fn = cls.__dict__[attr]
+                self._patched.append((cls, attr, fn))
+                setattr(cls, attr, self.timed(f"{cls.__name__}.{attr}", fn))
+        self.enabled = True
+    def disable(self):
+        for cls, attr, fn in reversed(self._patched):
+            setattr(cls, attr, fn)
+        self._patched = []
+        self.enabled = False
+    def reset(self):
+        with self._lock:
+            self.ops = {}
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: op.snapshot() for name, op in sorted(self.ops.items())}
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+    def report(self) -> str:
+        out = ["Operation , Calls , p50 ms , p95 ms , p99 ms , Rows , Bytes read , Bytes written"]
+        for name, m in self.snapshot().items():
+            out.append(f"{name} , {m['calls']} , {m['p50_ms']:.3f} , {m['p95_ms']:.3f} , {m['p99_ms']:.3f} , "
+                       f"{m['rows']} , {m['bytes_read']} , {m['bytes_written']}")
+        return "\n".join(out)
+
+METRICS = Metrics()
+
+STUDENT_FIELDS = ("Email_address", "First_name", "Last_name", "Course_id", "grades", "Marks")
+StudentRecord = namedtuple("StudentRecord", STUDENT_FIELDS)
 
-class CSVstore:
-    def __init__(self, path: str, headers: List[str]):
+class StudentRow:
+    __slots__ = ("_table", "_key")
+    def __init__(self, table: "StudentTable", key: str):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_key", key)
+    def __getattr__(self, name: str):
+        if name not in STUDENT_FIELDS:
+            raise AttributeError(name)
+        return self._table.get_field(self._key, name)
+    def __setattr__(self, name: str, value):
+        if name not in STUDENT_FIELDS:
+            raise AttributeError(name)
+        self._table.set_field(self._key, name, value)
+    def astuple(self) -> tuple:
+        return tuple(self._table.record(self._key))
+    def asdict(self) -> Dict:
+        return self._table.row(self._key)
+    def __eq__(self, other):
+        if isinstance(other, (StudentRow, Student, StudentRecord)):
+            return self.astuple() == tuple(getattr(other, f) for f in STUDENT_FIELDS)
+        return NotImplemented
+    __hash__ = None
+    def __repr__(self):
+        return "Student(" + ", ".join(f"{f}={v!r}" for f, v in zip(STUDENT_FIELDS, self.astuple())) + ")"
+
+class StudentRows(SequenceABC):
+    __slots__ = ("_table", "_keys")
+    def __init__(self, table: "StudentTable", keys: List[str]):
+        self._table = table
+        self._keys = keys
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return StudentRows(self._table, self._keys[i])
+        return StudentRow(self._table, self._keys[i])
+    def __len__(self) -> int:
+        return len(self._keys)
+    def __iter__(self):
+        table = self._table
+        for k in self._keys:
+            yield StudentRow(table, k)
+    def keys(self) -> List[str]:
+        return self._keys
+    def __eq__(self, other):
+        if isinstance(other, (StudentRows, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+    __hash__ = None
+    def __repr__(self):
+        return repr(list(self))
+
+class StudentTable(MutableMapping):
+    def __init__(self):
+        self.watchers: List = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self.slot_keys: List[Optional[str]] = []
+        self.emails: List[Optional[str]] = []
+        self.firsts: List[Optional[str]] = []
+        self.lasts: List[Optional[str]] = []
+        self.course_codes = array("I")
+        self.grade_codes = array("B")
+        self.marks = array("i")
+        self.course_names: List[str] = []
+        self.course_lookup: Dict[str, int] = {}
+        self.grade_names: List[str] = []
+        self.grade_lookup: Dict[str, int] = {}
+    @staticmethod
+    def _intern(value: str, names: List[str], lookup: Dict[str, int]) -> int:
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(names)
+            names.append(value)
+        return code
+    def watch(self, watcher):
+        self.watchers.append(watcher)
+        if hasattr(watcher, "build"):
+            watcher.build(self.records())
+        else:
+            for k, s in self.records():
+                watcher.add(k, s)
+        return watcher
+    def record(self, key: str) -> StudentRecord:
+        i = self._rows[key]
+        return StudentRecord(self.emails[i], self.firsts[i], self.lasts[i], self.course_names[self.course_codes[i]],
+                             self.grade_names[self.grade_codes[i]], self.marks[i])
+    def records(self):
+        cn, gn = self.course_names, self.grade_names
+        for key, i in self._rows.items():
+            yield key, StudentRecord(self.emails[i], self.firsts[i], self.lasts[i], cn[self.course_codes[i]],
+                                     gn[self.grade_codes[i]], self.marks[i])
+    def row(self, key: str) -> Dict:
+        return dict(zip(STUDENT_FIELDS, self.record(key)))
+    def rows(self):
+        for key in self._rows:
+            yield self.row(key)
+    def get_field(self, key: str, name: str):
+        i = self._rows[key]
+        if name == "Marks":
+            return self.marks[i]
+        if name == "Course_id":
+            return self.course_names[self.course_codes[i]]
+        if name == "grades":
+            return self.grade_names[self.grade_codes[i]]
+        if name == "Email_address":
+            return self.emails[i]
+        if name == "First_name":
+            return self.firsts[i]
+        return self.lasts[i]
+    def set_field(self, key: str, name: str, value):
+        self[key] = self.record(key)._replace(**{name: value})
+    def _write(self, i: int, email: str, first: str, last: str, cid: str, grade: str, marks: int):
+        self.emails[i], self.firsts[i], self.lasts[i] = email, first, last
+        self.course_codes[i] = self._intern(cid, self.course_names, self.course_lookup)
+        self.grade_codes[i] = self._intern(grade, self.grade_names, self.grade_lookup)
+        self.marks[i] = marks
+    def append_row(self, key: str, email: str, first: str, last: str, cid: str, grade: str, marks: int):
+        i = self._rows.get(key)
+        if i is None:
+            if self._free:
+                i = self._free.pop()
+            else:
+                i = len(self.emails)
+                self.slot_keys.append(None)
+                self.emails.append(None)
+                self.firsts.append(None)
+                self.lasts.append(None)
+                self.course_codes.append(0)
+                self.grade_codes.append(0)
+                self.marks.append(0)
+            self._rows[key] = i
+            self.slot_keys[i] = key
+        self._write(i, email, first, last, cid, grade, marks)
+    def load_columns(self, keys: List[str], emails: List[str], firsts: List[str], lasts: List[str],
+                     course_names: List[str], course_codes: array, grade_names: List[str], grade_codes: array, marks: array):
+        self._rows = dict(zip(keys, range(len(keys))))
+        self._free = []
+        self.slot_keys = list(keys)
+        self.emails, self.firsts, self.lasts = emails, firsts, lasts
+        self.course_names, self.course_codes = course_names, course_codes
+        self.grade_names, self.grade_codes = grade_names, grade_codes
+        self.marks = marks
+        self.course_lookup = {c: i for i, c in enumerate(course_names)}
+        self.grade_lookup = {g: i for i, g in enumerate(grade_names)}
+    def load_changes(self, changes: Iterable[tuple]):
+        rows: Dict[str, int] = {}
+        emails, firsts, lasts = [], [], []
+        course_codes, grade_codes, marks = array("I"), array("B"), array("i")
+        course_names, course_lookup, grade_names, grade_lookup = [], {}, [], {}
+        for op, r in changes:
+            key = r["Email_address"]
+            if op == "delete":
+                rows.pop(key, None)
+                continue
+            cid, grade = r["Course_id"], r["grades"]
+            c = course_lookup.get(cid)
+            if c is None:
+                c = course_lookup[cid] = len(course_names)
+                course_names.append(cid)
+            g = grade_lookup.get(grade)
+            if g is None:
+                g = grade_lookup[grade] = len(grade_names)
+                grade_names.append(grade)
+            i = rows.get(key)
+            if i is None:
+                rows[key] = len(emails)
+                emails.append(key)
+                firsts.append(r["First_name"])
+                lasts.append(r["Last_name"])
+                course_codes.append(c)
+                grade_codes.append(g)
+                marks.append(int(r["Marks"]))
+            else:
+                emails[i], firsts[i], lasts[i] = key, r["First_name"], r["Last_name"]
+                course_codes[i], grade_codes[i], marks[i] = c, g, int(r["Marks"])
+        if len(rows) < len(emails):
+            idx = list(rows.values())
+            emails, firsts, lasts = [emails[i] for i in idx], [firsts[i] for i in idx], [lasts[i] for i in idx]
+            course_codes = array("I", (course_codes[i] for i in idx))
+            grade_codes = array("B", (grade_codes[i] for i in idx))
+            marks = array("i", (marks[i] for i in idx))
+        self.load_columns(list(rows), emails, firsts, lasts, course_names, course_codes, grade_names, grade_codes, marks)
+    def column(self, field: str) -> List[Optional[str]]:
+        return {"Email_address": self.emails, "First_name": self.firsts, "Last_name": self.lasts}[field]
+    def views(self, keys: Iterable[str]) -> "StudentRows":
+        return StudentRows(self, list(keys))
+    def __getitem__(self, key: str) -> StudentRow:
+        if key not in self._rows:
+            raise KeyError(key)
+        return StudentRow(self, key)
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+    def __setitem__(self, key: str, s):
+        new = StudentRecord(*(getattr(s, f) for f in STUDENT_FIELDS))
+        watchers = self.watchers
+        if key in self._rows:
+            old = self.record(key)
+            changed = {f for f, a, b in zip(STUDENT_FIELDS, old, new) if a != b}
+            watchers = [w for w in watchers if not changed.isdisjoint(getattr(w, "DEPENDS", STUDENT_FIELDS))]
+            for w in watchers:
+                w.remove(key, old)
+        self.append_row(key, *new)
+        for w in watchers:
+            w.add(key, new)
+    def __delitem__(self, key: str):
+        old = self.record(key)
+        for w in self.watchers:
+            w.remove(key, old)
+        i = self._rows.pop(key)
+        self.slot_keys[i] = self.emails[i] = self.firsts[i] = self.lasts[i] = None
+        self._free.append(i)
+    def pop(self, key: str, *default):
+        if key not in self._rows:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        rec = self.record(key)
+        del self[key]
+        return rec
+    def popitem(self) -> tuple:
+        if not self._rows:
+            raise KeyError("popitem(): table is empty")
+        key = next(reversed(self._rows))
+        return key, self.pop(key)
+    def copy(self) -> Dict[str, StudentRecord]:
+        return dict(self.records())
+    def __iter__(self):
+        return iter(self._rows)
+    def __len__(self) -> int:
+        return len(self._rows)
+    def values(self):
+        return self.views(self._rows)
+    def items(self):
+        return [(k, StudentRow(self, k)) for k in self._rows]
+
+class CourseIndex:
+    DEPENDS = ("Course_id",)
+    def __init__(self, table: StudentTable):
+        self.table = table
+        self.by_course: Dict[str, Dict[str, None]] = {}
+    def add(self, key: str, s: Student):
+        self.by_course.setdefault(s.Course_id, {})[key] = None
+    def remove(self, key: str, s: Student):
+        rows = self.by_course.get(s.Course_id)
+        if rows is not None:
+            rows.pop(key, None)
+            if not rows:
+                del self.by_course[s.Course_id]
+    def build(self, items):
+        t = self.table
+        names, codes = t.course_names, t.course_codes
+        for key, i in t._rows.items():
+            self.by_course.setdefault(names[codes[i]], {})[key] = None
+    def count(self, cid: str) -> int:
+        return len(self.by_course.get(cid, ()))
+    def students_in(self, cid: str) -> "StudentRows":
+        return self.table.views(self.by_course.get(cid, ()))
+    def iter_records(self, cid: str):
+        record = self.table.record
+        for k in self.by_course.get(cid, ()):
+            yield record(k)
+
+class MarksDistribution:
+    PERCENTILES = (10, 25, 50, 75, 90)
+    MAX_MARK = 100
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts = [0] * (self.MAX_MARK + 1)
+        self.extra: Counter = Counter()
+        self.count = 0
+        self.total = 0
+        for m, n in (counts or {}).items():
+            self.add(m, n)
+    def add(self, marks: int, n: int = 1):
+        if 0 <= marks <= self.MAX_MARK:
+            self.counts[marks] += n
+        else:
+            self.extra[marks] += n
+        self.count += n
+        self.total += marks * n
+    def remove(self, marks: int, n: int = 1):
+        if 0 <= marks <= self.MAX_MARK:
+            n = min(n, self.counts[marks])
+            self.counts[marks] -= n
+        else:
+            n = min(n, self.extra[marks])
+            self.extra[marks] -= n
+            if not self.extra[marks]:
+                del self.extra[marks]
+        self.count -= n
+        self.total -= marks * n
+    def merge(self, other: "MarksDistribution"):
+        for m, n in other.items():
+            self.add(m, n)
+    def items(self):
+        extra = sorted(self.extra.items())
+        for m, n in extra:
+            if m < 0:
+                yield m, n
+        for m, n in enumerate(self.counts):
+            if n:
+                yield m, n
+        for m, n in extra:
+            if m > self.MAX_MARK:
+                yield m, n
+    def value_at(self, rank: int) -> int:
+        seen = 0
+        for m, n in self.items():
+            seen += n
+            if seen > rank:
+                return m
+        raise IndexError(rank)
+    def mean(self) -> float:
+        return round(self.total / self.count, 2) if self.count else 0.0
+    avg = mean
+    def median(self):
+        if not self.count:
+            return 0
+        if self.count % 2:
+            return self.value_at(self.count // 2)
+        return (self.value_at(self.count // 2 - 1) + self.value_at(self.count // 2)) / 2
+    def min(self):
+        return next(self.items())[0] if self.count else None
+    def max(self):
+        if not self.count:
+            return None
+        high = [m for m in self.extra if m > self.MAX_MARK]
+        if high:
+            return max(high)
+        for m in range(self.MAX_MARK, -1, -1):
+            if self.counts[m]:
+                return m
+        return max(self.extra)
+    def std(self) -> float:
+        if not self.count:
+            return 0.0
+        mu = self.total / self.count
+        return round(math.sqrt(sum(n * (m - mu) ** 2 for m, n in self.items()) / self.count), 2)
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        pos = q / 100 * (self.count - 1)
+        lo = int(pos)
+        a, b = self.value_at(lo), self.value_at(min(lo + 1, self.count - 1))
+        return round(a + (b - a) * (pos - lo), 2)
+    def letters(self) -> Dict[str, int]:
+        out = {letter: 0 for _, letter in Grades.SCALE}
+        pairs = list(self.items())
+        for (m, n), letter in zip(pairs, Grades.letters_for(m for m, _ in pairs)):
+            out[letter] = out.get(letter, 0) + n
+        return out
+    def histogram(self, width: int = 10) -> Dict[str, int]:
+        last = 99 // width * width
+        labels = [f"{low}-{100 if low == last else low + width - 1}" for low in range(0, last + 1, width)]
+        out = dict.fromkeys(labels, 0)
+        for m, n in self.items():
+            out[labels[min(max(m, 0) // width, len(labels) - 1)]] += n
+        return out
+    def summary(self):
+        return f"Avg={self.avg()} , Median={self.median()} , Min={self.min()} , Max={self.max()}"
+    def as_dict(self, percentiles: Sequence[float] = PERCENTILES, width: int = 10) -> Dict:
+        return {"count": self.count, "mean": self.mean(), "median": self.median(), "std": self.std(),
+                "min": self.min(), "max": self.max(),
+                "percentiles": {f"p{q:g}": self.percentile(q) for q in percentiles},
+                "letters": self.letters(), "histogram": self.histogram(width)}
+
+class CourseStatsIndex:
+    DEPENDS = ("Course_id", "Marks")
+    def __init__(self, table: StudentTable):
+        self.table = table
+        self.by_course: Dict[str, MarksDistribution] = {}
+    def add(self, key: str, s: Student):
+        self.by_course.setdefault(s.Course_id, MarksDistribution()).add(s.Marks)
+    def remove(self, key: str, s: Student):
+        st = self.by_course.get(s.Course_id)
+        if st is not None:
+            st.remove(s.Marks)
+            if not st.count:
+                del self.by_course[s.Course_id]
+    def build(self, items):
+        t = self.table
+        codes, marks = t.course_codes, t.marks
+        for (code, m), n in Counter((codes[i], marks[i]) for i in t._rows.values()).items():
+            cid = t.course_names[code]
+            st = self.by_course.get(cid)
+            if st is None:
+                st = self.by_course[cid] = MarksDistribution()
+            st.add(m, n)
+    def get(self, cid: str) -> Optional[MarksDistribution]:
+        return self.by_course.get(cid)
+
+class SearchIndex:
+    FIELDS = ("Email_address", "First_name", "Last_name")
+    N = 3
+    FALLBACK_SHARE = 0.25
+    def __init__(self, table: StudentTable, order: "SortIndex"):
+        self.table = table
+        self.order = order
+        self.grams: Dict[str, Dict[str, array]] = {}
+        self.size = 0
+        self.stale = 0
+    @property
+    def DEPENDS(self) -> tuple:
+        return tuple(self.grams)
+    @property
+    def emails(self) -> array:
+        return self.order.views["email"]
+    @classmethod
+    def ngrams(cls, text: str) -> Set[str]:
+        t = text.lower()
+        return {t[i:i + cls.N] for i in range(len(t) - cls.N + 1)}
+    def _index(self, field: str):
+        postings: Dict[str, array] = {}
+        n = self.N
+        for i, value in enumerate(self.table.column(field)):
+            if value is None:
+                continue
+            t = value.lower()
+            for g in {t[j:j + n] for j in range(len(t) - n + 1)}:
+                slots = postings.get(g)
+                if slots is None:
+                    slots = postings[g] = array("I")
+                slots.append(i)
+                self.size += 1
+        self.grams[field] = postings
+    def postings(self, field: str) -> Dict[str, array]:
+        if self.stale > self.size // 2:
+            fields = list(self.grams)
+            self.grams, self.size, self.stale = {}, 0, 0
+            for f in fields:
+                self._index(f)
+        if field not in self.grams:
+            self._index(field)
+        return self.grams[field]
+    def add(self, key: str, s: Student):
+        i = self.table._rows[key]
+        for f, postings in self.grams.items():
+            for g in self.ngrams(getattr(s, f)):
+                slots = postings.get(g)
+                if slots is None:
+                    slots = postings[g] = array("I")
+                slots.append(i)
+                self.size += 1
+    def build(self, items):
+        self.grams, self.size, self.stale = {}, 0, 0
+    def remove(self, key: str, s: Student):
+        for f in self.grams:
+            self.stale += len(self.ngrams(getattr(s, f)))
+    def prefix(self, text: str, limit: Optional[int] = None) -> List[str]:
+        t = text.lower()
+        emails, keys, view = self.table.emails, self.table.slot_keys, self.emails
+        out = []
+        for pos in range(bisect.bisect_left(view, t, key=lambda i: emails[i].lower()), len(view)):
+            i = view[pos]
+            if not emails[i].lower().startswith(t) or (limit is not None and len(out) >= limit):
+                break
+            out.append(keys[i])
+        return out
+    def candidates(self, text: str, field: str) -> Optional[Set[int]]:
+        grams = self.ngrams(text)
+        if not grams:
+            return None
+        postings = self.postings(field)
+        smallest = min((postings.get(g, ()) for g in grams), key=len)
+        if len(smallest) > self.FALLBACK_SHARE * len(self.table):
+            return None
+        column = self.table.column(field)
+        t = text.lower()
+        return {i for i in set(smallest) if column[i] is not None and t in column[i].lower()}
+    def scan(self, text: str, fields: Sequence[str]):
+        t = text.lower()
+        emails, keys = self.table.emails, self.table.slot_keys
+        others = [self.table.column(f) for f in fields if f != "Email_address"]
+        by_email = "Email_address" in fields
+        for i in self.emails:
+            if by_email and t in emails[i].lower():
+                yield keys[i]
+            elif others and any(t in column[i].lower() for column in others):
+                yield keys[i]
+    def matches(self, text: str, fields: Sequence[str] = ("Email_address",), limit: Optional[int] = None) -> Iterable[str]:
+        slots: Set[int] = set()
+        for f in fields:
+            found = self.candidates(text, f)
+            if found is None:
+                keys = self.scan(text, fields)
+                return keys if limit is None else itertools.islice(keys, limit)
+            slots |= found
+        emails, names = self.table.emails, self.table.slot_keys
+        order = ((emails[i].lower(), names[i]) for i in slots)
+        order = sorted(order) if limit is None else heapq.nsmallest(limit, order)
+        return [k for _, k in order]
+
+class SortIndex:
+    DEPENDS = ("Marks", "Email_address")
+    def __init__(self, table: StudentTable):
+        self.table = table
+        self.views: Dict[str, array] = {"marks": array("I"), "email": array("I")}
+    def sort_key(self, by: str):
+        emails, keys = self.table.emails, self.table.slot_keys
+        if by == "marks":
+            marks = self.table.marks
+            return lambda i: (marks[i], emails[i], keys[i])
+        return lambda i: (emails[i].lower(), keys[i])
+    @staticmethod
+    def entries(key: str, s: Student):
+        return {"marks": (s.Marks, s.Email_address, key), "email": (s.Email_address.lower(), key)}
+    def add(self, key: str, s: Student):
+        i = self.table._rows[key]
+        for by, view in self.views.items():
+            bisect.insort(view, i, key=self.sort_key(by))
+    def remove(self, key: str, s: Student):
+        i = self.table._rows[key]
+        for by, entry in self.entries(key, s).items():
+            view = self.views[by]
+            pos = bisect.bisect_left(view, entry, key=self.sort_key(by))
+            if pos < len(view) and view[pos] == i:
+                del view[pos]
+    def build(self, items):
+        t = self.table
+        slots = sorted(t._rows.values(), key=t.slot_keys.__getitem__)
+        self.views["email"] = array("I", sorted(slots, key=lambda i: t.emails[i].lower()))
+        slots.sort(key=t.emails.__getitem__)
+        slots.sort(key=t.marks.__getitem__)
+        self.views["marks"] = array("I", slots)
+    def keys(self, by: str, descending: bool, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        view, keys = self.views[by], self.table.slot_keys
+        n = len(view)
+        stop = n if limit is None else min(n, offset + limit)
+        if descending:
+            return [keys[i] for i in reversed(view[n - stop:n - offset])] if stop > offset else []
+        return [keys[i] for i in view[offset:stop]]
+
+def _parse_csv_chunk(path: str, start: int, end: int) -> List[List[str]]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+
+class UndoLog:
+    def __init__(self):
+        self.before: Dict[str, Optional[StudentRecord]] = {}
+    def build(self, items):
+        pass
+    def add(self, key: str, s: Student):
+        self.before.setdefault(key, None)
+    def remove(self, key: str, s: Student):
+        self.before.setdefault(key, s)
+    def rollback(self, table: StudentTable):
+        for key, old in self.before.items():
+            if old is not None:
+                table[key] = old
+            elif key in table:
+                del table[key]
+
+class ReportCache:
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self.tags: Dict[tuple, Set[tuple]] = {}
+        self.key_tags: Dict[tuple, tuple] = {}
+        self.hits = self.misses = self.evictions = 0
+        self._mutex = threading.Lock()
+    def get(self, key: tuple, render, tags: Sequence[tuple]) -> str:
+        with self._mutex:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = render()
+        with self._mutex:
+            self._drop(key)
+            self.entries[key] = value
+            self.key_tags[key] = tuple(tags)
+            for t in tags:
+                self.tags.setdefault(t, set()).add(key)
+            while len(self.entries) > self.capacity:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+        return value
+    def _drop(self, key: tuple):
+        if self.entries.pop(key, None) is None:
+            return
+        for t in self.key_tags.pop(key):
+            keys = self.tags.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[t]
+    def invalidate(self, *tags: tuple):
+        with self._mutex:
+            for t in tags:
+                for key in list(self.tags.get(t, ())):
+                    self._drop(key)
+    def invalidate_kind(self, kind: str):
+        with self._mutex:
+            for key in [k for k in self.entries if k[0] == kind]:
+                self._drop(key)
+    def clear(self):
+        with self._mutex:
+            self.entries.clear()
+            self.tags.clear()
+            self.key_tags.clear()
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.entries),
+                "capacity": self.capacity, "hit_rate": self.hits / total if total else 0.0}
+    def build(self, items):
+        self.clear()
+    def add(self, key: str, s: Student):
+        self.invalidate(("student", key), ("course", s.Course_id))
+    remove = add
+
+class StoreConflictError(RuntimeError):
+    pass
+
+class IntegrityError(ValueError):
+    pass
+
+@dataclass
+class IntegrityReport:
+    orphans: List[tuple]
+    mismatches: List[tuple]
+    duplicates: List[tuple]
+    @property
+    def ok(self) -> bool:
+        return not (self.orphans or self.mismatches or self.duplicates)
+    def lines(self):
+        for store, key, field, value in self.orphans:
+            yield f"orphan: {store} {key} has {field}={value} with no matching record"
+        for store, key, ident in self.mismatches:
+            yield f"mismatch: {store} key {key} holds id {ident}"
+        for store, ident, keys in self.duplicates:
+            yield f"duplicate: {store} id {ident} stored under {', '.join(keys)}"
+    def summary(self) -> str:
+        if self.ok:
+            return "Integrity OK."
+        return (f"{len(self.orphans)} orphan(s), {len(self.mismatches)} key mismatch(es), "
+                f"{len(self.duplicates)} duplicate id(s)")
+
+def check_integrity(students: Optional[StudentTable], courses: Optional[Dict[str, Course]],
+                    professors: Optional[Dict[str, Professor]], users: Optional[Dict[str, LoginUser]]) -> IntegrityReport:
+    orphans: List[tuple] = []
+    mismatches: List[tuple] = []
+    duplicates: List[tuple] = []
+    ids: Dict[str, Dict[str, List[str]]] = {"students": {}, "courses": {}, "professors": {}, "users": {}}
+    def index(store: str, key: str, ident: str):
+        if key != ident:
+            mismatches.append((store, key, ident))
+        ids[store].setdefault(ident, []).append(key)
+    def is_student(ident: str) -> bool:
+        i = students._rows.get(ident)
+        return (i is not None and students.emails[i] == ident) or ident in ids["students"]
+    if students is not None:
+        emails, codes, names = students.emails, students.course_codes, students.course_names
+        missing = {c for c, cid in enumerate(names) if courses is not None and cid not in courses}
+        aliased = set()
+        for key, i in students._rows.items():
+            if key != emails[i]:
+                mismatches.append(("students", key, emails[i]))
+                aliased.add(emails[i])
+            if codes[i] in missing:
+                orphans.append(("students", key, "Course_id", names[codes[i]]))
+        for key, i in students._rows.items() if aliased else ():
+            if emails[i] in aliased:
+                ids["students"].setdefault(emails[i], []).append(key)
+    for key, c in (courses or {}).items():
+        index("courses", key, c.Course_id)
+    for key, p in (professors or {}).items():
+        index("professors", key, p.Professor_id)
+        if courses is not None and p.Course_id not in courses:
+            orphans.append(("professors", key, "Course_id", p.Course_id))
+    for key, u in (users or {}).items():
+        index("users", key, u.User_id)
+        if students is not None and u.Role == "student" and not is_student(u.User_id):
+            orphans.append(("users", key, "User_id", u.User_id))
+    for store, by_id in ids.items():
+        for ident, keys in by_id.items():
+            if len(keys) > 1:
+                duplicates.append((store, ident, keys))
+    return IntegrityReport(orphans, mismatches, duplicates)
+
+class StorageBackend(ABC):
+    seen: Optional[List] = None
+    @abstractmethod
+    def read_all(self) -> List[Dict]:
+        ...
+    @abstractmethod
+    def iter_changes(self, workers: Optional[int] = None):
+        ...
+    @abstractmethod
+    def write_all(self, rows: Iterable[Dict], check: bool = False) -> None:
+        ...
+    @abstractmethod
+    def upsert(self, row: Dict) -> None:
+        ...
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+    @abstractmethod
+    def signature(self) -> List:
+        ...
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict]:
+        ...
+    def compact(self) -> None:
+        pass
+    @contextmanager
+    def locked(self, exclusive: bool = False):
+        yield
+    @contextmanager
+    def reading(self):
+        with self.locked():
+            yield
+            self.seen = self.signature()
+    def changed(self) -> bool:
+        return self.signature() != self.seen
+
+class CSVstore(StorageBackend):
+    METRICS_OPS = ("read_all", "write_all", "upsert", "delete", "compact")
+    JOURNAL_MIN_ROWS = 1000
+    PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+    CHUNK_BYTES = 8 * 1024 * 1024
+    COMPRESSION_SUFFIXES = {".gz": "gzip", ".xz": "lzma", ".lzma": "lzma"}
+    COMPRESSION_EXTENSIONS = {"gzip": ".gz", "lzma": ".xz"}
+    COMPRESSION_LEVELS = {"gzip": 6, "lzma": 1}
+    def __init__(self, path: str, headers: List[str], key: Optional[str] = None, compression: Optional[str] = None):
         self.path = path
         self.headers = headers
+        self.key = key or headers[0]
+        self.compression = compression or self.COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+        if self.compression not in (None, "gzip", "lzma"):
+            raise ValueError(f"Unknown compression: {self.compression}")
+        self.journal_path = path + ".journal"
+        self.lock_path = path + ".lock"
+        self.base_rows = 0
+        self.journal_rows: Optional[int] = None
+        self.seen: Optional[List] = None
+        self._mutex = threading.RLock()
+        self._lock_file = None
+        self._lock_exclusive = False
         os.makedirs(os.path.dirname(self.path), exist_ok=True)
         if not os.path.exists(self.path):
-            with open(self.path, "w", newline="") as f:
+            with self._open(self.path, "w") as f:
                 csv.DictWriter(f, fieldnames=self.headers).writeheader()
+    def _open(self, path: str, mode: str = "r"):
+        if self.compression == "gzip":
+            import gzip
+            return gzip.open(path, mode + "t", compresslevel=self.COMPRESSION_LEVELS["gzip"], encoding="utf-8", newline="")
+        if self.compression == "lzma":
+            import lzma
+            preset = self.COMPRESSION_LEVELS["lzma"] if mode == "w" else None
+            return lzma.open(path, mode + "t", preset=preset, encoding="utf-8", newline="")
+        return open(path, mode, newline="")
+    @contextmanager
+    def locked(self, exclusive: bool = False):
+        with self._mutex:
+            if self._lock_file is not None:
+                upgrade = exclusive and not self._lock_exclusive
+                if upgrade:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+                    self._lock_exclusive = True
+                try:
+                    yield
+                finally:
+                    if upgrade:
+                        fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+                        self._lock_exclusive = False
+                return
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._lock_file, self._lock_exclusive = f, exclusive
+                try:
+                    yield
+                finally:
+                    self._lock_file, self._lock_exclusive = None, False
     def read_all(self) -> List[Dict]:
+        rows: Dict[str, Dict] = {}
+        with self.reading():
+            for r in self.iter_base():
+                rows[r[self.key]] = r
+            for op, r in self.iter_journal():
+                if op == "upsert":
+                    rows[r[self.key]] = r
+                elif op == "delete":
+                    rows.pop(r[self.key], None)
+        return list(rows.values())
+    def iter_changes(self, workers: Optional[int] = None):
+        with self.locked():
+            for r in self.iter_base(workers):
+                yield "upsert", r
+            yield from self.iter_journal()
+    def iter_base(self, workers: Optional[int] = None):
+        self.base_rows = 0
+        with self.locked():
+            if (workers and workers > 1 and self.compression is None
+                    and os.path.getsize(self.path) >= self.PARALLEL_MIN_BYTES):
+                rows = self._iter_parallel(workers)
+            else:
+                rows = self._iter_sequential()
+            for r in rows:
+                self.base_rows += 1
+                yield r
+            if METRICS.enabled:
+                METRICS.count("CSVstore.read_base", self.base_rows, os.path.getsize(self.path))
+    def iter_journal(self):
+        self.journal_rows = 0
+        with self.locked():
+            if not os.path.exists(self.journal_path):
+                return
+            fields, size = None, 0
+            for values, size, whole in self._journal_records():
+                if fields is None:
+                    fields = values if whole else []
+                elif whole and len(values) == len(fields):
+                    self.journal_rows += 1
+                    r = dict(zip(fields, values))
+                    yield r.pop("_op"), r
+            if METRICS.enabled:
+                METRICS.count("CSVstore.read_journal", self.journal_rows, size)
+    def _journal_records(self):
+        end = [0, True]
+        def lines(f):
+            for line in f:
+                end[0] += len(line)
+                end[1] = line.endswith(b"\n")
+                yield line.decode()
+        with open(self.journal_path, "rb") as f:
+            for values in csv.reader(lines(f)):
+                yield values, end[0], end[1]
+    def _trim_journal(self) -> int:
+        with open(self.journal_path, "rb") as f:
+            size = f.seek(0, 2)
+            if size:
+                f.seek(-1, 2)
+                if f.read(1) == b"\n":
+                    return size
+        good = 0
+        for _, end, whole in self._journal_records():
+            if whole:
+                good = end
+        os.truncate(self.journal_path, good)
+        return good
+    def _iter_sequential(self):
+        with self._open(self.path) as f:
+            yield from csv.DictReader(f)
+    def chunk_ranges(self, chunk_bytes: Optional[int] = None) -> List[tuple]:
+        chunk_bytes = chunk_bytes or self.CHUNK_BYTES
+        out = []
+        with open(self.path, "rb") as f:
+            f.readline()
+            start = end = f.tell()
+            size = os.fstat(f.fileno()).st_size
+            quoted = 0
+            while start < size:
+                target = min(start + chunk_bytes, size)
+                quoted ^= f.read(target - end).count(b'"') & 1
+                end = target
+                while end < size:
+                    line = f.readline()
+                    end += len(line)
+                    quoted ^= line.count(b'"') & 1
+                    if not quoted:
+                        break
+                out.append((start, end))
+                start = end
+        return out
+    def _iter_parallel(self, workers: int):
         with open(self.path, newline="") as f:
-            return list(csv.DictReader(f))
-    def write_all(self, rows: List[Dict]) -> None:
-        with open(self.path, "w", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=self.headers)
-            w.writeheader()
-            w.writerows(rows)
+            fields = next(csv.reader(f), self.headers)
+        from concurrent.futures import ProcessPoolExecutor
+        pending = deque()
+        with ProcessPoolExecutor(workers) as ex:
+            for start, end in self.chunk_ranges():
+                pending.append(ex.submit(_parse_csv_chunk, self.path, start, end))
+                if len(pending) >= 2 * workers:
+                    for values in pending.popleft().result():
+                        yield dict(zip(fields, values))
+            while pending:
+                for values in pending.popleft().result():
+                    yield dict(zip(fields, values))
+    def write_all(self, rows: Iterable[Dict], check: bool = False) -> None:
+        with self.locked(True):
+            if check and self.seen is not None and self.changed():
+                raise StoreConflictError(f"{self.path} was changed by another process; refresh before saving.")
+            n = 0
+            tmp = self.path + ".tmp"
+            with self._open(tmp, "w") as f:
+                w = csv.DictWriter(f, fieldnames=self.headers)
+                w.writeheader()
+                for r in rows:
+                    w.writerow(r)
+                    n += 1
+            if METRICS.enabled:
+                METRICS.count("CSVstore.write_all", n, bytes_written=os.path.getsize(tmp))
+            os.replace(tmp, self.path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self.base_rows = n
+            self.journal_rows = 0
+            self.seen = self.signature()
+    def signature(self) -> List:
+        out = []
+        for p in (self.path, self.journal_path):
+            try:
+                st = os.stat(p)
+                out.append([st.st_mtime_ns, st.st_size])
+            except FileNotFoundError:
+                out.append(None)
+        return out
+    def get(self, key: str) -> Optional[Dict]:
+        found = None
+        with self.reading():
+            with self._open(self.path) as f:
+                reader = csv.reader(f)
+                fields = next(reader, self.headers)
+                i = fields.index(self.key)
+                for values in reader:
+                    if len(values) > i and values[i] == key:
+                        found = dict(zip(fields, values))
+            for op, r in self.iter_journal():
+                if r[self.key] == key:
+                    found = r if op == "upsert" else None
+        return found
+    def upsert(self, row: Dict) -> None:
+        self._append("upsert", row)
+    def delete(self, key: str) -> None:
+        self._append("delete", {self.key: key})
+    def compact(self) -> None:
+        with self.locked(True):
+            in_sync = not self.changed()
+            self.write_all(self.read_all())
+            if not in_sync:
+                self.seen = []
+    def _count_rows(self):
+        counts = []
+        for p in (self.path, self.journal_path):
+            try:
+                with self._open(p) if p == self.path else open(p, "rb") as f:
+                    counts.append(max(0, sum(1 for _ in f) - 1))
+            except FileNotFoundError:
+                counts.append(0)
+        self.base_rows, self.journal_rows = counts
+    def _append(self, op: str, row: Dict) -> None:
+        with self.locked(True):
+            if self.journal_rows is None:
+                self._count_rows()
+            before = self.signature()
+            size = self._trim_journal() if before[1] is not None else 0
+            with open(self.journal_path, "a", newline="") as f:
+                w = csv.writer(f)
+                if not size:
+                    w.writerow(["_op"] + self.headers)
+                w.writerow([op] + [row.get(h, "") for h in self.headers])
+                if METRICS.enabled:
+                    METRICS.count("CSVstore.append", 1, bytes_written=f.tell() - size)
+            if before == self.seen:
+                self.seen = self.signature()
+            self.journal_rows += 1
+            if self.journal_rows > max(self.JOURNAL_MIN_ROWS, self.base_rows):
+                self.compact()
+
+class SQLiteStore(StorageBackend):
+    METRICS_OPS = ("read_all", "write_all", "upsert", "delete")
+    INTEGER_COLUMNS = {"Marks", "Credits"}
+    INDEXES = {"students": [("Email_address COLLATE NOCASE",), ("Course_id", "Marks"), ("Marks", "Email_address")]}
+    def __init__(self, path: str, table: str, headers: List[str], key: Optional[str] = None):
+        self.path = path
+        self.table = table
+        self.headers = headers
+        self.key = key or headers[0]
+        self._mutex = threading.RLock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        import sqlite3
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        cols = ", ".join(f"{h} {'INTEGER' if h in self.INTEGER_COLUMNS else 'TEXT'}" for h in headers)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols}, PRIMARY KEY ({self.key}))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS _generations (name TEXT PRIMARY KEY, gen INTEGER NOT NULL)")
+        self.conn.execute("INSERT OR IGNORE INTO _generations VALUES (?, 0)", (table,))
+        for i, cols in enumerate(self.INDEXES.get(table, ())):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{i} ON {table} ({', '.join(cols)})")
+        self._columns = ", ".join(headers)
+    @contextmanager
+    def _transaction(self, check: bool = False):
+        with self._mutex:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self.signature()
+                if check and self.seen is not None and before != self.seen:
+                    raise StoreConflictError(f"{self.table} in {self.path} was changed by another process; refresh before saving.")
+                yield
+                self.conn.execute("UPDATE _generations SET gen = gen + 1 WHERE name = ?", (self.table,))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            if before == self.seen:
+                self.seen = self.signature()
+    @contextmanager
+    def _snapshot(self):
+        with self._mutex:
+            self.conn.execute("BEGIN")
+            try:
+                yield
+            finally:
+                self.conn.execute("COMMIT")
+    def _dicts(self, cursor) -> List[Dict]:
+        return [dict(zip(self.headers, row)) for row in cursor]
+    def signature(self) -> List:
+        return [self.conn.execute("SELECT gen FROM _generations WHERE name = ?", (self.table,)).fetchone()[0]]
+    def read_all(self) -> List[Dict]:
+        with self.reading():
+            return self._dicts(self.conn.execute(f"SELECT {self._columns} FROM {self.table} ORDER BY rowid"))
+    def iter_changes(self, workers: Optional[int] = None):
+        for r in self.read_all():
+            yield "upsert", r
+    def write_all(self, rows: Iterable[Dict], check: bool = False) -> None:
+        marks = ", ".join("?" for _ in self.headers)
+        with self._transaction(check):
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.executemany(f"INSERT OR REPLACE INTO {self.table} ({self._columns}) VALUES ({marks})",
+                                  ([r.get(h) for h in self.headers] for r in rows))
+        self.seen = self.signature()
+    def upsert(self, row: Dict) -> None:
+        marks = ", ".join("?" for _ in self.headers)
+        updates = ", ".join(f"{h} = excluded.{h}" for h in self.headers if h != self.key)
+        with self._transaction():
+            self.conn.execute(f"INSERT INTO {self.table} ({self._columns}) VALUES ({marks}) "
+                              f"ON CONFLICT({self.key}) DO UPDATE SET {updates}", [row.get(h) for h in self.headers])
+    def delete(self, key: str) -> None:
+        with self._transaction():
+            self.conn.execute(f"DELETE FROM {self.table} WHERE {self.key} = ?", (key,))
+    def get(self, key: str) -> Optional[Dict]:
+        rows = self._dicts(self.conn.execute(f"SELECT {self._columns} FROM {self.table} WHERE {self.key} = ?", (key,)))
+        return rows[0] if rows else None
+    def course_stats(self, cid: str) -> Optional[tuple]:
+        with self._snapshot():
+            n, total, mn, mx = self.conn.execute(
+                f"SELECT COUNT(*), SUM(Marks), MIN(Marks), MAX(Marks) FROM {self.table} WHERE Course_id = ?", (cid,)).fetchone()
+            if not n:
+                return None
+            mid = [m for (m,) in self.conn.execute(
+                f"SELECT Marks FROM {self.table} WHERE Course_id = ? ORDER BY Marks LIMIT ? OFFSET ?",
+                (cid, 2 - n % 2, (n - 1) // 2))]
+        median = mid[0] if n % 2 else (mid[0] + mid[1]) / 2
+        return n, round(total / n, 2), median, mn, mx
+    def search(self, substr: str, limit: Optional[int] = None, prefix: bool = False) -> List[Dict]:
+        pattern = substr.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = pattern + "%" if prefix else "%" + pattern + "%"
+        return self._dicts(self.conn.execute(
+            f"SELECT {self._columns} FROM {self.table} WHERE Email_address LIKE ? ESCAPE '\\' "
+            f"ORDER BY Email_address COLLATE NOCASE, Email_address LIMIT ?", (pattern, -1 if limit is None else limit)))
+    def sort(self, by: str, descending: bool, offset: int = 0, limit: Optional[int] = None,
+             course: Optional[str] = None) -> List[Dict]:
+        direction = "DESC" if descending else "ASC"
+        order = (f"Marks {direction}, Email_address {direction}" if by == "marks"
+                 else f"Email_address COLLATE NOCASE {direction}, Email_address {direction}")
+        where, args = ("WHERE Course_id = ?", [course]) if course is not None else ("", [])
+        return self._dicts(self.conn.execute(
+            f"SELECT {self._columns} FROM {self.table} {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            args + [-1 if limit is None else limit, offset]))
+
+STORE_SCHEMAS = {
+    "students": ("Student.csv", ["Email_address", "First_name", "Last_name", "Course_id", "grades", "Marks"]),
+    "courses": ("Course.csv", ["Course_id", "Course_name", "Description", "Credits"]),
+    "professors": ("Professor.csv", ["Professor_id", "Professor_Name", "Rank", "Course_id"]),
+    "users": ("Login.csv", ["User_id", "Password", "Role"]),
+}
+
+def open_store(data_dir: str, name: str, backend: str = "csv", compression: Optional[str] = None,
+               fallback: bool = True) -> StorageBackend:
+    filename, headers = STORE_SCHEMAS[name]
+    if backend == "sqlite":
+        return SQLiteStore(os.path.join(data_dir, "checkmygrade.db"), name, headers)
+    if backend != "csv":
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if compression is not None:
+        if compression not in CSVstore.COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        path = os.path.join(data_dir, filename + CSVstore.COMPRESSION_EXTENSIONS[compression])
+        plain = os.path.join(data_dir, filename)
+        if fallback and not os.path.exists(path) and os.path.exists(plain):
+            print(f"Note: {os.path.basename(path)} not found; using {filename}. "
+                  f"Run convert_csv_compression to compress it.")
+            return CSVstore(plain, headers)
+        return CSVstore(path, headers, compression=compression)
+    return CSVstore(os.path.join(data_dir, filename), headers, compression=compression)
+
+def migrate_csv_to_sqlite(data_dir: str, compression: Optional[str] = None) -> Dict[str, int]:
+    counts = {}
+    for name in STORE_SCHEMAS:
+        rows = open_store(data_dir, name, compression=compression).read_all()
+        open_store(data_dir, name, "sqlite").write_all(rows)
+        counts[name] = len(rows)
+    return counts
+
+def convert_csv_compression(data_dir: str, compression: Optional[str], source: Optional[str] = None) -> Dict[str, int]:
+    counts = {}
+    for name in STORE_SCHEMAS:
+        src = open_store(data_dir, name, compression=source, fallback=False)
+        dest = open_store(data_dir, name, compression=compression, fallback=False)
+        counts[name] = 0
+        def rows():
+            for r in src.read_all():
+                counts[name] += 1
+                yield r
+        dest.write_all(rows())
+    return counts
+
+SNAPSHOT_MAGIC = b"CMGSNAP1"
+
+class LazyStore:
+    def __init__(self, store: str):
+        self.store = store
+    def __set_name__(self, owner, name: str):
+        self.attr = "_" + name
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.attr)
+        if value is None:
+            obj.load_store(self.store)
+            value = obj.__dict__[self.attr]
+        return value
+    def __set__(self, obj, value):
+        obj.__dict__[self.attr] = value
 
 class CheckMyGradeApp:
-    def __init__(self, data_dir: str = "data"):
-        self.students_store = CSVstore(os.path.join(data_dir, "Student.csv"), ["Email_address", "First_name", "Last_name", "Course_id", "grades", "Marks"])
-        self.courses_store  = CSVstore(os.path.join(data_dir, "Course.csv"), ["Course_id", "Course_name", "Description", "Credits"])
-        self.profs_store    = CSVstore(os.path.join(data_dir, "Professor.csv"), ["Professor_id", "Professor_Name", "Rank", "Course_id"])
-        self.users_store    = CSVstore(os.path.join(data_dir, "Login.csv"), ["User_id", "Password", "Role"])
-        self.students: Dict[str, Student] = {}
-        self.courses: Dict[str, Course] = {}
-        self.professors: Dict[str, Professor] = {}
-        self.users: Dict[str, LoginUser] = {}
-        self.load_all()
+    METRICS_OPS = ("load_all", "load_students", "load_courses", "load_profs", "load_users", "refresh",
+                   "save_students", "save_courses", "save_profs", "save_users", "write_snapshot", "load_snapshot",
+                   "login", "report_student", "course_stats", "report_course_full", "report_professor", "report_courses",
+                   "search_students", "sort_students", "import_students", "import_courses", "import_professors",
+                   "put_record", "drop_record", "export_students", "regrade", "analytics")
+    LAZY_ATTRS = {"students": ("students", "course_index", "stats_index", "search_index", "sort_index"),
+                  "courses": ("courses",), "professors": ("professors",), "users": ("users",)}
+    students = LazyStore("students")
+    course_index = LazyStore("students")
+    stats_index = LazyStore("students")
+    search_index = LazyStore("students")
+    sort_index = LazyStore("students")
+    courses = LazyStore("courses")
+    professors = LazyStore("professors")
+    users = LazyStore("users")
+    def __init__(self, data_dir: str = "data", snapshot: bool = False, load_workers: Optional[int] = None,
+                 auth_workers: int = 4, backend: str = "csv", compression: Optional[str] = None, lazy: bool = True):
+        self.auth = Authenticator(lambda email: self.users.get(email), auth_workers)
+        self.load_workers = os.cpu_count() if load_workers is None else load_workers
+        self.dirty: Optional[Set[str]] = None
+        self.report_cache = ReportCache()
+        self._integrity: Optional[IntegrityReport] = None
+        self._load_lock = threading.RLock()
+        self.strict_integrity = False
+        self.delete_rule = "none"
+        self.snapshot_path = os.path.join(data_dir, "snapshot.bin")
+        self.snapshot_on_save = snapshot
+        self.students_store = open_store(data_dir, "students", backend, compression)
+        self.courses_store  = open_store(data_dir, "courses", backend, compression)
+        self.profs_store    = open_store(data_dir, "professors", backend, compression)
+        self.users_store    = open_store(data_dir, "users", backend, compression)
+        if not lazy:
+            self.load_all()
+    def loaded(self, name: str) -> bool:
+        return self.__dict__.get("_" + self.LAZY_ATTRS[name][0]) is not None
+    def unload(self, *names: str):
+        for name in names or STORE_SCHEMAS:
+            for attr in self.LAZY_ATTRS[name]:
+                self.__dict__.pop("_" + attr, None)
+    def load_store(self, name: str):
+        with self._load_lock:
+            if self.loaded(name):
+                return
+            if not any(self.loaded(n) for n in STORE_SCHEMAS) and self.load_snapshot():
+                return
+            {"students": self.load_students, "courses": self.load_courses,
+             "professors": self.load_profs, "users": self.load_users}[name]()
+    @property
+    def integrity(self) -> IntegrityReport:
+        if self._integrity is None:
+            self._integrity = self.check_integrity()
+        return self._integrity
+    @integrity.setter
+    def integrity(self, report: Optional[IntegrityReport]):
+        self._integrity = report
+    def lookup(self, kind: str, key: str):
+        if self.loaded(kind):
+            return {"students": self.students, "courses": self.courses,
+                    "professors": self.professors, "users": self.users}[kind].get(key)
+        r = self.stores()[kind].get(key)
+        return None if r is None else self._from_row(kind, r)
+    @staticmethod
+    def _from_row(kind: str, r: Dict):
+        if kind == "students":
+            return StudentRecord(r["Email_address"], r["First_name"], r["Last_name"], r["Course_id"], r["grades"], int(r["Marks"]))
+        if kind == "courses":
+            return Course(r["Course_id"], r["Course_name"], r.get("Description", ""), int(r.get("Credits", "3") or 3))
+        if kind == "professors":
+            return Professor(r["Professor_id"], r["Professor_Name"], r["Rank"], r["Course_id"])
+        return LoginUser(r["User_id"], r["Password"], r["Role"])
+    def stores(self) -> Dict[str, StorageBackend]:
+        return {"students": self.students_store, "courses": self.courses_store,
+                "professors": self.profs_store, "users": self.users_store}
     def load_all(self):
-        self.students = {}
-        for r in self.students_store.read_all():
-            self.students[r["Email_address"]] = Student(r["Email_address"], r["First_name"], r["Last_name"], r["Course_id"], r["grades"], int(r["Marks"]))
-        self.courses = {}
-        for r in self.courses_store.read_all():
-            self.courses[r["Course_id"]] = Course(r["Course_id"], r["Course_name"], r.get("Description", ""), int(r.get("Credits", "3") or 3))
-        self.professors = {}
-        for r in self.profs_store.read_all():
-            self.professors[r["Professor_id"]] = Professor(r["Professor_id"], r["Professor_Name"], r["Rank"], r["Course_id"])
-        self.users = {}
-        for r in self.users_store.read_all():
-            self.users[r["User_id"]] = LoginUser(r["User_id"], r["Password"], r["Role"])
+        if not self.load_snapshot():
+            self.load_students()
+            self.load_courses()
+            self.load_profs()
+            self.load_users()
+        self.integrity = self.check_integrity()
+    def check_integrity(self, loaded_only: bool = False) -> IntegrityReport:
+        def get(name, attr):
+            return getattr(self, attr) if not loaded_only or self.loaded(name) else None
+        return check_integrity(get("students", "students"), get("courses", "courses"),
+                               get("professors", "professors"), get("users", "users"))
+    def load_students(self):
+        table = StudentTable()
+        with self.students_store.reading():
+            table.load_changes(self.students_store.iter_changes(self.load_workers))
+        self.students = table
+        self.index_students()
+    def refresh(self) -> List[str]:
+        loaders = {"students": self.load_students, "courses": self.load_courses,
+                   "professors": self.load_profs, "users": self.load_users}
+        changed = [name for name, store in self.stores().items() if store.seen is not None and store.changed()]
+        for name in changed:
+            if self.loaded(name):
+                loaders[name]()
+            elif name == "students":
+                self.report_cache.invalidate_kind("student")
+        if changed:
+            self.integrity = None
+        return changed
+    def index_students(self):
+        self.course_index = self.students.watch(CourseIndex(self.students))
+        self.stats_index = self.students.watch(CourseStatsIndex(self.students))
+        self.sort_index = self.students.watch(SortIndex(self.students))
+        self.search_index = self.students.watch(SearchIndex(self.students, self.sort_index))
+        if not any(w is self.report_cache for w in self.students.watchers):
+            self.students.watch(self.report_cache)
+    def load_courses(self, rows: Optional[Iterable[Dict]] = None):
+        self.report_cache.invalidate(("courses",))
+        self.courses = {r["Course_id"]: self._from_row("courses", r)
+                        for r in (self.courses_store.read_all() if rows is None else rows)}
+    def load_profs(self, rows: Optional[Iterable[Dict]] = None):
+        self.report_cache.invalidate_kind("professor")
+        self.professors = {r["Professor_id"]: self._from_row("professors", r)
+                           for r in (self.profs_store.read_all() if rows is None else rows)}
+    def load_users(self, rows: Optional[Iterable[Dict]] = None):
+        self.users = {r["User_id"]: self._from_row("users", r)
+                      for r in (self.users_store.read_all() if rows is None else rows)}
+    def write_snapshot(self, path: Optional[str] = None):
+        path = path or self.snapshot_path
+        t = self.students
+        keys = list(t._rows)
+        idx = list(t._rows.values())
+        blobs = [
+            ("keys", "\0".join(keys).encode("utf-8")),
+            ("emails", "\0".join(t.emails[i] for i in idx).encode("utf-8")),
+            ("firsts", "\0".join(t.firsts[i] for i in idx).encode("utf-8")),
+            ("lasts", "\0".join(t.lasts[i] for i in idx).encode("utf-8")),
+            ("course_codes", array("I", (t.course_codes[i] for i in idx)).tobytes()),
+            ("grade_codes", array("B", (t.grade_codes[i] for i in idx)).tobytes()),
+            ("marks", array("i", (t.marks[i] for i in idx)).tobytes()),
+        ]
+        sections, offset = {}, 0
+        for name, b in blobs:
+            sections[name] = [offset, len(b)]
+            offset += len(b)
+        header = json.dumps({
+            "byteorder": sys.byteorder,
+            "sources": {name: store.signature() for name, store in self.stores().items()},
+            "count": len(keys), "sections": sections,
+            "course_names": t.course_names, "grade_names": t.grade_names,
+            "courses": [asdict(c) for c in self.courses.values()],
+            "professors": [asdict(p) for p in self.professors.values()],
+            "users": [asdict(u) for u in self.users.values()],
+        }).encode("utf-8")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(len(header).to_bytes(8, "little"))
+            f.write(header)
+            for _, b in blobs:
+                f.write(b)
+        os.replace(tmp, path)
+    def load_snapshot(self, path: Optional[str] = None, force: bool = False) -> bool:
+        path = path or self.snapshot_path
+        if not os.path.exists(path) or os.path.getsize(path) < 16:
+            return False
+        import mmap
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:8] != SNAPSHOT_MAGIC:
+                return False
+            n = int.from_bytes(mm[8:16], "little")
+            header = json.loads(mm[16:16 + n])
+            if header["byteorder"] != sys.byteorder:
+                return False
+            current = {name: store.signature() for name, store in self.stores().items()}
+            if not force and header["sources"] != current:
+                return False
+            base, count = 16 + n, header["count"]
+            def blob(name):
+                off, length = header["sections"][name]
+                return mm[base + off:base + off + length]
+            def strings(name):
+                return blob(name).decode("utf-8").split("\0") if count else []
+            def numbers(name, code):
+                a = array(code)
+                a.frombytes(blob(name))
+                return a
+            table = StudentTable()
+            table.load_columns(strings("keys"), strings("emails"), strings("firsts"), strings("lasts"),
+                               header["course_names"], numbers("course_codes", "I"),
+                               header["grade_names"], numbers("grade_codes", "B"), numbers("marks", "i"))
+        self.students = table
+        self.index_students()
+        self.load_courses(header["courses"])
+        self.load_profs(header["professors"])
+        self.load_users(header["users"])
+        for name, store in self.stores().items():
+            store.seen = current[name]
+        return True
+    def snapshot_to_csv(self, path: Optional[str] = None) -> bool:
+        if not self.load_snapshot(path, force=True):
+            return False
+        self.save_students()
+        self.save_courses()
+        self.save_profs()
+        self.save_users()
+        return True
     def save_students(self):
-        self.students_store.write_all([asdict(s) for s in self.students.values()])
+        if self.dirty is not None:
+            self.dirty.add("students")
+            return
+        self.students_store.write_all(self.students.rows(), check=True)
+        self._after_save()
     def save_courses(self):
-        self.courses_store.write_all([asdict(c) for c in self.courses.values()])
+        self.report_cache.invalidate(("courses",))
+        if self.dirty is not None:
+            self.dirty.add("courses")
+            return
+        self.courses_store.write_all([asdict(c) for c in self.courses.values()], check=True)
+        self._after_save()
     def save_profs(self):
-        self.profs_store.write_all([asdict(p) for p in self.professors.values()])
+        self.report_cache.invalidate_kind("professor")
+        if self.dirty is not None:
+            self.dirty.add("professors")
+            return
+        self.profs_store.write_all([asdict(p) for p in self.professors.values()], check=True)
+        self._after_save()
     def save_users(self):
-        self.users_store.write_all([asdict(u) for u in self.users.values()])
+        if self.dirty is not None:
+            self.dirty.add("users")
+            return
+        self.users_store.write_all([asdict(u) for u in self.users.values()], check=True)
+        self._after_save()
+    def _after_save(self):
+        if self.snapshot_on_save:
+            self.write_snapshot()
+    def _invalidate_reports(self, store: str, key: str):
+        if store == "courses":
+            self.report_cache.invalidate(("courses",))
+        elif store == "professors":
+            self.report_cache.invalidate(("professor", key))
+    def write_row(self, store: str, row: Dict):
+        self._invalidate_reports(store, row[self.stores()[store].headers[0]])
+        if self.dirty is not None:
+            self.dirty.add(store)
+        else:
+            self.stores()[store].upsert(row)
+    def remove_row(self, store: str, key: str):
+        self._invalidate_reports(store, key)
+        if self.dirty is not None:
+            self.dirty.add(store)
+        else:
+            self.stores()[store].delete(key)
+    @contextmanager
+    def batch(self):
+        if self.dirty is not None:
+            yield self
+            return
+        self.dirty = set()
+        table = self.students if self.loaded("students") else None
+        undo = table.watch(UndoLog()) if table is not None else None
+        saved = {name: {k: replace(v) for k, v in getattr(self, attr).items()}
+                 for name, attr in (("courses", "courses"), ("professors", "professors"), ("users", "users"))
+                 if self.loaded(name)}
+        savers = {"students": self.save_students, "courses": self.save_courses,
+                  "professors": self.save_profs, "users": self.save_users}
+        written: List[str] = []
+        try:
+            yield self
+            report = self.check_integrity(loaded_only=True)
+            if self.strict_integrity and not report.ok:
+                raise IntegrityError(report.summary())
+            dirty, self.dirty = [n for n in savers if n in self.dirty], None
+            with ExitStack() as locks:
+                for name in dirty:
+                    store = self.stores()[name]
+                    locks.enter_context(store.locked(True))
+                    if store.seen is not None and store.changed():
+                        raise StoreConflictError(f"{name} was changed by another process; refresh before saving.")
+                for name in dirty:
+                    savers[name]()
+                    written.append(name)
+            self.integrity = report if all(self.loaded(n) for n in STORE_SCHEMAS) else None
+        except BaseException:
+            self.dirty = None
+            if table is not None:
+                table.watchers.remove(undo)
+                self.students = table
+                undo.rollback(table)
+            else:
+                self.unload("students")
+            for name, attr in (("courses", "courses"), ("professors", "professors"), ("users", "users")):
+                if name in saved:
+                    setattr(self, attr, saved[name])
+                else:
+                    self.unload(name)
+            self.report_cache.clear()
+            for name in written:
+                if name in saved or (name == "students" and table is not None):
+                    savers[name]()
+            raise
+        if table is not None:
+            table.watchers.remove(undo)
     def register_user(self, email: str, password: str, role: str):
         if email in self.users:
             print("User already exists.")
@@ -105,22 +1709,32 @@ class CheckMyGradeApp:
             print("Role must be student or professor.")
             return
         self.users[email] = LoginUser(email, PasswordHasher.hash_password(password), role)
-        self.save_users()
+        self.write_row("users", asdict(self.users[email]))
         print("Account created successfully.")
     def login(self, email: str, password: str):
-        u = self.users.get(email)
-        if not u:
-            return None
-        return u if PasswordHasher.verify_password(password, u.Password) else None
+        u = self.auth.verify(email, password)
+        if u and PasswordHasher.needs_rehash(u.Password):
+            u = self.rehash_password(u, password)
+        return u
+    def rehash_password(self, u: LoginUser, password: str) -> LoginUser:
+        self.users[u.User_id] = LoginUser(u.User_id, PasswordHasher.hash_password(password), u.Role)
+        self.write_row("users", asdict(self.users[u.User_id]))
+        return self.users[u.User_id]
+    def authenticate(self, email: str, password: str) -> Optional[str]:
+        u = self.login(email, password)
+        return self.auth.open_session(u) if u else None
+    def session_user(self, token: str) -> Optional[LoginUser]:
+        return self.auth.session(token)
     def change_password(self, email: str):
+        import getpass
         oldp = getpass.getpass("Old password: ")
         u = self.login(email, oldp)
         if not u:
             print("Invalid old password.")
             return
         newp = getpass.getpass("New password: ")
-        self.users[email].Password = PasswordHasher.hash_password(newp)
-        self.save_users()
+        self.users[email] = LoginUser(u.User_id, PasswordHasher.hash_password(newp), u.Role)
+        self.write_row("users", asdict(self.users[email]))
         print("Password updated.")
     def add_student(self):
         email = input("Student email: ").strip()
@@ -137,7 +1751,7 @@ class CheckMyGradeApp:
             return
         grade = Grades.letter_for(marks)
         self.students[email] = Student(email, first, last, cid, grade, marks)
-        self.save_students()
+        self.write_row("students", self.students.row(email))
         print("Student added successfully.")
     def update_student(self):
         email = input("Enter student email to update: ").strip()
@@ -149,21 +1763,21 @@ class CheckMyGradeApp:
         new_last  = input(f"Last name  [{s.Last_name}]: ").strip() or s.Last_name
         new_cid   = input(f"Course ID  [{s.Course_id}]: ").strip() or s.Course_id
         marks_in  = input(f"Marks (0-100) [{s.Marks}]: ").strip()
+        marks, grade = s.Marks, s.grades
         if marks_in:
             try:
-                m = int(marks_in)
-                s.Marks = m
-                s.grades = Grades.letter_for(m)
+                marks = int(marks_in)
+                grade = Grades.letter_for(marks)
             except ValueError:
                 print("Marks must be integers.")
-        s.First_name, s.Last_name, s.Course_id = new_first, new_last, new_cid
-        self.save_students()
+        self.students[email] = Student(s.Email_address, new_first, new_last, new_cid, grade, marks)
+        self.write_row("students", self.students.row(email))
         print("Student updated successfully.")
     def delete_student(self):
         email = input("Enter student email to delete: ").strip()
         if email in self.students:
             del self.students[email]
-            self.save_students()
+            self.remove_row("students", email)
             print("Student deleted successfully.")
         else:
             print("Not found.")
@@ -177,7 +1791,7 @@ class CheckMyGradeApp:
         credits_txt = input("Credits (default 3): ").strip()
         credits = int(credits_txt) if credits_txt.isdigit() else 3
         self.courses[cid] = Course(cid, name, desc, credits)
-        self.save_courses()
+        self.write_row("courses", asdict(self.courses[cid]))
         print("Course added.")
     def update_course(self):
         cid = input("Enter course_id to be update: ").strip()
@@ -190,24 +1804,49 @@ class CheckMyGradeApp:
         cr = input(f"Credits [{c.Credits}]: ").strip()
         if cr.isdigit():
             c.Credits = int(cr)
-        self.save_courses()
+        self.write_row("courses", asdict(c))
         print("Course updated.")
     def delete_course(self):
         cid = input("Enter course_id to be delete: ").strip()
-        if cid in self.courses:
+        try:
+            found = self.drop_course(cid)
+        except IntegrityError as e:
+            print(e)
+            return
+        print("Course deleted." if found else "Not found.")
+    def drop_course(self, cid: str, rule: Optional[str] = None) -> bool:
+        rule = rule or self.delete_rule
+        if rule not in ("none", "restrict", "cascade"):
+            raise ValueError(f"Unknown delete rule: {rule}")
+        if cid not in self.courses:
+            return False
+        students = list(self.course_index.by_course.get(cid, ()))
+        profs = [pid for pid, p in self.professors.items() if p.Course_id == cid]
+        if rule == "restrict" and (students or profs):
+            raise IntegrityError(f"Course {cid} is still used by {len(students)} student(s) and {len(profs)} professor(s).")
+        with self.batch() if rule == "cascade" else nullcontext():
+            if rule == "cascade":
+                for k in students:
+                    del self.students[k]
+                    self.remove_row("students", k)
+                for pid in profs:
+                    del self.professors[pid]
+                    self.remove_row("professors", pid)
             del self.courses[cid]
-            self.save_courses()
-            print("Course deleted.")
-        else:
-            print("Not found.")
+            self.remove_row("courses", cid)
+        return True
             
     def list_courses(self):
+        print(self.report_courses())
+    def report_courses(self):
+        return self.report_cache.get(("courses",), self._render_courses, [("courses",)])
+    def _render_courses(self):
         if not self.courses:
-            print("No courses found.")
-            return
-        print("Course_id , Course_name , Credits")
+            return "No courses found."
+        out = ["Course_id , Course_name , Credits"]
         for c in self.courses.values():
-            print(f"{c.Course_id} , {c.Course_name} , {c.Credits}")
+            out.append(f"{c.Course_id} , {c.Course_name} , {c.Credits}")
+        return "\n".join(out)
             
     def add_professor(self):
         pid = input("Professor email: ").strip()
@@ -218,7 +1857,7 @@ class CheckMyGradeApp:
         rank  = input("Rank: ").strip()
         cid   = input("Course ID: ").strip()
         self.professors[pid] = Professor(pid, pname, rank, cid)
-        self.save_profs()
+        self.write_row("professors", asdict(self.professors[pid]))
         print("Professor added.")
     def update_professor(self):
         pid = input("Professor email to update: ").strip()
@@ -229,76 +1868,302 @@ class CheckMyGradeApp:
         p.Professor_Name = input(f"Name [{p.Professor_Name}]: ").strip() or p.Professor_Name
         p.Rank = input(f"Rank [{p.Rank}]: ").strip() or p.Rank
         p.Course_id = input(f"Course ID [{p.Course_id}]: ").strip() or p.Course_id
-        self.save_profs()
+        self.write_row("professors", asdict(p))
         print("Professor updated.")
     def delete_professor(self):
         pid = input("Professor email to delete: ").strip()
         if pid in self.professors:
             del self.professors[pid]
-            self.save_profs()
+            self.remove_row("professors", pid)
             print("Professor deleted.")
         else:
             print("Not found.")
     def report_student(self, email: str):
-        s = self.students.get(email)
+        return self.report_cache.get(("student", email), lambda: self._render_student(email), [("student", email)])
+    def _render_student(self, email: str):
+        s = self.lookup("students", email)
         if not s:
             return "No record."
         return f"{s.First_name} {s.Last_name} ({s.Email_address}) | {s.Course_id} | {s.Marks} ({s.grades})"
+    def _pushdown(self, op: str):
+        if self.loaded("students"):
+            return None
+        return getattr(self.students_store, op, None)
     def course_stats(self, cid: str):
-        rows = [s.Marks for s in self.students.values() if s.Course_id == cid]
-        if not rows:
+        query = self._pushdown("course_stats")
+        if query is not None:
+            row = query(cid)
+            if row is None:
+                return "0 student(s) in " + cid
+            n, avg, median, mn, mx = row
+            return f"{n} student(s) in {cid}\nAvg={avg} , Median={median} , Min={mn} , Max={mx}"
+        st = self.stats_index.get(cid)
+        if st is None:
             return "0 student(s) in " + cid
-        avg = round(sum(rows)/len(rows), 2)
-        med = statistics.median(rows)
-        mn = min(rows)
-        mx = max(rows)
-        return f"{len(rows)} student(s) in {cid}\nAvg={avg} , Median={med} , Min={mn} , Max={mx}"
+        return f"{st.count} student(s) in {cid}\n{st.summary()}"
     def report_course_full(self, cid: str):
-        rows = [s for s in self.students.values() if s.Course_id == cid]
-        out = [f"{len(rows)} student(s) in {cid}"]
-        for s in rows:
-            out.append(f"- {s.Email_address}\t{s.First_name} {s.Last_name}\t{s.Marks} {s.grades}")
-        if rows:
-            marks = [s.Marks for s in rows]
-            out.append(f"Avg={round(sum(marks)/len(marks),2)} , Median={statistics.median(marks)} , Min={min(marks)} , Max={max(marks)}")
-        return "\n".join(out)
+        return self.report_cache.get(("course", cid), lambda: self._render_course_full(cid), [("course", cid)])
+    def _render_course_full(self, cid: str):
+        if METRICS.enabled:
+            METRICS.count("CheckMyGradeApp.report_course_full", self.course_index.count(cid))
+        return "\n".join(self.iter_course_report(cid))
+    @staticmethod
+    def _student_line(s: StudentRecord) -> str:
+        return f"- {s.Email_address}\t{s.First_name} {s.Last_name}\t{s.Marks} {s.grades}"
+    def iter_course_report(self, cid: str):
+        yield f"{self.course_index.count(cid)} student(s) in {cid}"
+        for s in self.course_index.iter_records(cid):
+            yield self._student_line(s)
+        st = self.stats_index.get(cid)
+        if st is not None:
+            yield st.summary()
     def report_professor(self, pid: str):
+        p = self.professors.get(pid)
+        tags = [("professor", pid)] if p is None else [("professor", pid), ("course", p.Course_id)]
+        return self.report_cache.get(("professor", pid), lambda: self._render_professor(pid), tags)
+    def _render_professor(self, pid: str):
+        return "\n".join(self.iter_professor_report(pid))
+    def iter_professor_report(self, pid: str):
         p = self.professors.get(pid)
         if not p:
-            return "No record."
-        rows = [s for s in self.students.values() if s.Course_id == p.Course_id]
-        out = [f"{p.Professor_Name} -> Course {p.Course_id}"]
-        for s in rows:
-            out.append(f"- {s.Email_address}\t{s.First_name} {s.Last_name}\t{s.Marks} {s.grades}")
-        return "\n".join(out)
-    def search_students(self, substr: str):
+            yield "No record."
+            return
+        yield f"{p.Professor_Name} -> Course {p.Course_id}"
+        for s in self.course_index.iter_records(p.Course_id):
+            yield self._student_line(s)
+    def search_students(self, substr: str, limit: Optional[int] = None, prefix: bool = False,
+                        fields: Sequence[str] = ("Email_address",)):
         t0 = time.perf_counter()
-        res = [s for s in self.students.values() if substr.lower() in s.Email_address.lower()]
+        sub = substr.lower()
+        query = self._pushdown("search") if tuple(fields) == ("Email_address",) else None
+        if query is not None:
+            res = [self._from_row("students", r) for r in query(sub, limit, prefix)]
+            return res, (time.perf_counter() - t0) * 1000.0
+        if prefix:
+            keys = self.search_index.prefix(sub, limit)
+        else:
+            keys = list(self.search_index.matches(sub, fields, limit))
+        res = self.students.views(keys)
+        if METRICS.enabled:
+            METRICS.count("CheckMyGradeApp.search_students", len(res))
         dt = (time.perf_counter() - t0) * 1000.0
         return res, dt
-    def sort_students(self, by: str, descending: bool):
-        if by == "marks":
-            key = lambda s: (s.Marks, s.Email_address)
-        else:
-            key = lambda s: s.Email_address.lower()
+    def iter_search_students(self, substr: str, prefix: bool = False, fields: Sequence[str] = ("Email_address",)):
+        sub = substr.lower()
+        query = self._pushdown("search") if tuple(fields) == ("Email_address",) else None
+        if query is not None:
+            for r in query(sub, None, prefix):
+                yield self._from_row("students", r)
+            return
+        keys = self.search_index.prefix(sub, None) if prefix else self.search_index.matches(sub, fields)
+        for k in keys:
+            yield StudentRow(self.students, k)
+    def sort_students(self, by: str, descending: bool, offset: int = 0, limit: Optional[int] = None,
+                      course: Optional[str] = None):
+        by = "marks" if by == "marks" else "email"
         t0 = time.perf_counter()
-        out = sorted(self.students.values(), key=key, reverse=descending)
+        query = self._pushdown("sort")
+        if query is not None:
+            out = [self._from_row("students", r) for r in query(by, descending, offset, limit, course)]
+            return out, (time.perf_counter() - t0) * 1000.0
+        t = self.students
+        if course is None:
+            out = t.views(self.sort_index.keys(by, descending, offset, limit))
+        else:
+            slot, marks, emails = t._rows, t.marks, t.emails
+            if by == "marks":
+                key = lambda k: (marks[slot[k]], emails[slot[k]])
+            else:
+                key = lambda k: emails[slot[k]].lower()
+            keys = self.course_index.by_course.get(course, ())
+            if limit is None:
+                picked = sorted(keys, key=key, reverse=descending)[offset:]
+            else:
+                pick = heapq.nlargest if descending else heapq.nsmallest
+                picked = pick(offset + limit, keys, key=key)[offset:]
+            out = t.views(picked)
+            if METRICS.enabled:
+                METRICS.count("CheckMyGradeApp.sort_students", len(keys))
         dt = (time.perf_counter() - t0) * 1000.0
         return out, dt
+    def top_students(self, k: int, course: Optional[str] = None, lowest: bool = False):
+        return self.sort_students("marks", not lowest, 0, k, course)
+    def analytics(self, percentiles: Sequence[float] = MarksDistribution.PERCENTILES, width: int = 10) -> Dict:
+        by_course = self.stats_index.by_course
+        overall = MarksDistribution()
+        for d in by_course.values():
+            overall.merge(d)
+        if METRICS.enabled:
+            METRICS.count("CheckMyGradeApp.analytics", overall.count)
+        empty = MarksDistribution()
+        return {"overall": overall.as_dict(percentiles, width),
+                "courses": {cid: d.as_dict(percentiles, width) for cid, d in sorted(by_course.items())},
+                "professors": {pid: by_course.get(p.Course_id, empty).as_dict(percentiles, width)
+                               for pid, p in sorted(self.professors.items())}}
+    def report_analytics(self, width: int = 10) -> str:
+        data = self.analytics(width=width)
+        out = []
+        def section(title, stats):
+            pct = " ".join(f"{k}={v}" for k, v in stats["percentiles"].items())
+            out.append(f"{title}: n={stats['count']} mean={stats['mean']} median={stats['median']} std={stats['std']} {pct}")
+            out.append("  letters " + " ".join(f"{k}:{v}" for k, v in stats["letters"].items()))
+            out.append("  hist    " + " ".join(f"{k}:{v}" for k, v in stats["histogram"].items()))
+        section("All students", data["overall"])
+        for cid, stats in data["courses"].items():
+            section(f"Course {cid}", stats)
+        for pid, stats in data["professors"].items():
+            section(f"Professor {pid} ({self.professors[pid].Course_id})", stats)
+        return "\n".join(out)
+    @staticmethod
+    def _records(source, fields: Sequence[str]):
+        if isinstance(source, str):
+            with open(source, newline="") as f:
+                yield from csv.DictReader(f)
+        else:
+            for r in source:
+                yield r if isinstance(r, dict) else {f: getattr(r, f, "") for f in fields}
+    @staticmethod
+    def _text(r: Dict, field: str) -> str:
+        v = r.get(field)
+        return "" if v is None else str(v).strip()
+    def parse_student(self, r: Dict) -> StudentRecord:
+        email, cid = self._text(r, "Email_address"), self._text(r, "Course_id")
+        try:
+            marks = int(self._text(r, "Marks"))
+        except ValueError:
+            raise ValueError("Marks must be integers.")
+        if not email or not cid:
+            raise ValueError("Email_address and Course_id are required.")
+        if not 0 <= marks <= 100:
+            raise ValueError("Marks must be between 0 and 100.")
+        return StudentRecord(email, self._text(r, "First_name"), self._text(r, "Last_name"),
+                             cid, Grades.letter_for(marks), marks)
+    def parse_course(self, r: Dict) -> Course:
+        cid, credits = self._text(r, "Course_id"), self._text(r, "Credits") or "3"
+        if not cid:
+            raise ValueError("Course_id is required.")
+        if not credits.isdigit():
+            raise ValueError("Credits must be integers.")
+        return Course(cid, self._text(r, "Course_name"), self._text(r, "Description"), int(credits))
+    def parse_professor(self, r: Dict) -> Professor:
+        pid, cid = self._text(r, "Professor_id"), self._text(r, "Course_id")
+        if not pid or not cid:
+            raise ValueError("Professor_id and Course_id are required.")
+        return Professor(pid, self._text(r, "Professor_Name"), self._text(r, "Rank"), cid)
+    def _parse_all(self, source, fields: Sequence[str], parse):
+        rows: Dict = {}
+        errors: List[str] = []
+        for n, r in enumerate(self._records(source, fields), 1):
+            try:
+                rec = parse(r)
+            except ValueError as e:
+                errors.append(f"record {n}: {e}")
+                continue
+            rows[getattr(rec, fields[0])] = rec
+        return rows, errors
+    def import_students(self, source, strict: bool = False) -> Dict:
+        rows, errors = self._parse_all(source, STUDENT_FIELDS, self.parse_student)
+        if errors and strict:
+            return {"added": 0, "updated": 0, "errors": errors}
+        added = sum(1 for k in rows if k not in self.students)
+        if len(rows) > len(self.students) // 4:
+            indexes = (self.course_index, self.stats_index, self.search_index, self.sort_index)
+            self.students.watchers = [w for w in self.students.watchers if w not in indexes]
+            for k, rec in rows.items():
+                self.students[k] = rec
+            self.index_students()
+        else:
+            for k, rec in rows.items():
+                self.students[k] = rec
+        if rows:
+            self.save_students()
+        return {"added": added, "updated": len(rows) - added, "errors": errors}
+    def import_courses(self, source, strict: bool = False) -> Dict:
+        rows, errors = self._parse_all(source, ("Course_id", "Course_name", "Description", "Credits"), self.parse_course)
+        return self._apply_import(self.courses, rows, errors, strict, self.save_courses)
+    def import_professors(self, source, strict: bool = False) -> Dict:
+        rows, errors = self._parse_all(source, ("Professor_id", "Professor_Name", "Rank", "Course_id"), self.parse_professor)
+        return self._apply_import(self.professors, rows, errors, strict, self.save_profs)
+    def regrade(self, course: Optional[str] = None) -> int:
+        t = self.students
+        keys = list(self.course_index.by_course.get(course, ())) if course is not None else list(t)
+        letters = Grades.letters_for(t.get_field(k, "Marks") for k in keys)
+        changed = 0
+        for k, letter in zip(keys, letters):
+            if t.get_field(k, "grades") != letter:
+                t.set_field(k, "grades", letter)
+                changed += 1
+        if changed:
+            self.save_students()
+        return changed
+    def put_record(self, kind: str, record: Dict):
+        if kind == "students":
+            rec = self.parse_student(record)
+            self.students[rec.Email_address] = rec
+            self.write_row("students", self.students.row(rec.Email_address))
+            return self.students[rec.Email_address]
+        if kind == "courses":
+            c = self.parse_course(record)
+            self.courses[c.Course_id] = c
+            self.write_row("courses", asdict(c))
+            return c
+        if kind == "professors":
+            p = self.parse_professor(record)
+            self.professors[p.Professor_id] = p
+            self.write_row("professors", asdict(p))
+            return p
+        raise ValueError(f"Unknown record kind: {kind}")
+    def drop_record(self, kind: str, key: str) -> bool:
+        target = {"students": self.students, "courses": self.courses, "professors": self.professors}.get(kind)
+        if target is None:
+            raise ValueError(f"Unknown record kind: {kind}")
+        if kind == "courses":
+            return self.drop_course(key)
+        if key not in target:
+            return False
+        del target[key]
+        self.remove_row(kind, key)
+        return True
+    @staticmethod
+    def _apply_import(target: Dict, rows: Dict, errors: List[str], strict: bool, save) -> Dict:
+        if errors and strict:
+            return {"added": 0, "updated": 0, "errors": errors}
+        added = sum(1 for k in rows if k not in target)
+        target.update(rows)
+        if rows:
+            save()
+        return {"added": added, "updated": len(rows) - added, "errors": errors}
+    def export_students(self, dest, course: Optional[str] = None, grade: Optional[str] = None) -> int:
+        keys = self.course_index.by_course.get(course, ()) if course is not None else self.students
+        f = open(dest, "w", newline="") if isinstance(dest, str) else dest
+        try:
+            w = csv.writer(f)
+            w.writerow(STUDENT_FIELDS)
+            n = 0
+            for k in keys:
+                rec = self.students.record(k)
+                if grade is None or rec.grades == grade:
+                    w.writerow(rec)
+                    n += 1
+        finally:
+            if isinstance(dest, str):
+                f.close()
+        return n
 
 def minimum_info(app: CheckMyGradeApp):
-    if "DATA200" not in app.courses:
-        app.courses["DATA200"] = Course("DATA200", "Python", "Advanced to basic python", 1)
-        app.save_courses()
-    if "micheal@mycsu.edu" not in app.professors:
-        app.professors["micheal@mycsu.edu"] = Professor("mick@sjsu.edu", "Mick Cena", "Professor", "DATA200")
-        app.save_profs()
-    if "sam@mycsu.edu" not in app.students:
-        app.students["sam@mycsu.edu"] = Student("dean@sjsu.edu", "Dean", "Carpenter", "DATA200", Grades.letter_for(96), 96)
-        app.save_students()
-    if "prof@mycsu.edu" not in app.users:
-        app.users["prof@mycsu.edu"] = LoginUser("prof@mycsu.edu", PasswordHasher.hash_password("Welcome12#_"), "professor")
-        app.save_users()
+    with app.batch():
+        if app.lookup("courses", "DATA200") is None:
+            app.courses["DATA200"] = Course("DATA200", "Python", "Advanced to basic python", 1)
+            app.write_row("courses", asdict(app.courses["DATA200"]))
+        if app.lookup("professors", "mick@sjsu.edu") is None:
+            app.professors["mick@sjsu.edu"] = Professor("mick@sjsu.edu", "Mick Cena", "Professor", "DATA200")
+            app.write_row("professors", asdict(app.professors["mick@sjsu.edu"]))
+        if app.lookup("students", "dean@sjsu.edu") is None:
+            app.students["dean@sjsu.edu"] = Student("dean@sjsu.edu", "Dean", "Carpenter", "DATA200", Grades.letter_for(96), 96)
+            app.write_row("students", app.students.row("dean@sjsu.edu"))
+        if app.lookup("users", "prof@mycsu.edu") is None:
+            app.users["prof@mycsu.edu"] = LoginUser("prof@mycsu.edu", PasswordHasher.hash_password("Welcome12#_"), "professor")
+            app.write_row("users", asdict(app.users["prof@mycsu.edu"]))
 
 def student_menu(app: CheckMyGradeApp, user: LoginUser):
     while True:
@@ -320,7 +2185,42 @@ def student_menu(app: CheckMyGradeApp, user: LoginUser):
         else:
             print("Invalid choice.")
 
+def write_lines(lines: Iterable[str], dest) -> int:
+    f = open(dest, "w", newline="") if isinstance(dest, str) else dest
+    n = 0
+    try:
+        for line in lines:
+            f.write(line + "\n")
+            n += 1
+    finally:
+        if isinstance(dest, str):
+            f.close()
+    return n
+
+def paginate(lines: Iterable[str], page_size: int = 20) -> int:
+    shown = 0
+    for line in lines:
+        if page_size and shown and shown % page_size == 0:
+            if input("-- Enter for more, q to stop: ").strip().lower() == "q":
+                break
+        print(line)
+        shown += 1
+    return shown
+
+def ask_page_size(default: int = 20) -> int:
+    n_txt = input(f"Page size (default {default}, 0 for all): ").strip()
+    return int(n_txt) if n_txt.isdigit() else default
+
+def show_report(lines: Iterable[str]):
+    dest = input("Save to file (blank to show): ").strip()
+    if dest:
+        print(f"{write_lines(lines, dest)} line(s) written to {dest}")
+    else:
+        paginate(lines, ask_page_size())
+
 def professor_menu(app: CheckMyGradeApp, user: LoginUser):
+    if not app.integrity.ok:
+        print(f"Warning: {app.integrity.summary()} (run with --check for details)")
     while True:
         print("\nProfessor Menu")
         print("1) Add student")
@@ -339,6 +2239,7 @@ def professor_menu(app: CheckMyGradeApp, user: LoginUser):
         print("14) Sort students")
         print("15) Change password")
         print("16) Logout")
+        print("17) Department analytics")
         c = input("Enter your choice: ").strip()
         if c == "1":
             app.add_student()
@@ -362,32 +2263,42 @@ def professor_menu(app: CheckMyGradeApp, user: LoginUser):
             app.delete_professor()
         elif c == "11":
             cid = input("Course ID: ").strip()
-            print(app.report_course_full(cid))
+            show_report(app.iter_course_report(cid))
         elif c == "12":
             pid = input("Professor email: ").strip()
-            print(app.report_professor(pid))
+            show_report(app.iter_professor_report(pid))
         elif c == "13":
             sub = input("Email substring: ").strip()
             res, ms = app.search_students(sub)
-            print(f"Found {len(res)} student in {ms:.2f} ms")
-            for s in res:
-                print(f"- {s.Email_address} , {s.Marks} {s.grades}")
+            print(f"Found {len(res)} student(s) in {ms:.2f} ms")
+            paginate((f"- {s.Email_address} , {s.Marks} {s.grades}" for s in res), ask_page_size())
         elif c == "14":
             by = input("Sort by marks/email: ").strip().lower()
             order = input("Order by asc/desc: ").strip().lower()
             desc = order == "desc"
-            lst, ms = app.sort_students(by if by in ("marks", "email") else "email", desc)
-            print(f"Sorted {len(lst)} records in {ms:.2f} ms")
-            for s in lst:
-                print(f"- {s.Email_address} , {s.Marks} {s.grades}")
+            cid = input("Course ID (blank for all): ").strip() or None
+            page = ask_page_size() or None
+            total = len(app.students) if cid is None else app.course_index.count(cid)
+            offset = 0
+            while True:
+                lst, ms = app.sort_students(by if by in ("marks", "email") else "email", desc, offset, page, cid)
+                print(f"Showing {offset + 1}-{offset + len(lst)} of {total} records in {ms:.2f} ms")
+                for s in lst:
+                    print(f"- {s.Email_address} , {s.Marks} {s.grades}")
+                offset += len(lst)
+                if offset >= total or not lst or input("-- Enter for more, q to stop: ").strip().lower() == "q":
+                    break
         elif c == "15":
             app.change_password(user.User_id)
         elif c == "16":
             break
+        elif c == "17":
+            print(app.report_analytics())
         else:
             print("Invalid choice.")
 
 def main_menu(app: CheckMyGradeApp):
+    import getpass
     while True:
         print("\nCheckMyGrade")
         print("1) Login")
@@ -422,10 +2333,241 @@ def main_menu(app: CheckMyGradeApp):
         else:
             print("Invalid choice.")
 
+class RWLock:
+    def __init__(self):
+        import asyncio
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    @asynccontextmanager
+    async def read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._waiting_writers)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+    @asynccontextmanager
+    async def write(self):
+        async with self._cond:
+            self._waiting_writers += 1
+            await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+class GradeService:
+    STUDENT_OPS = {"logout", "report_student", "course_stats", "list_courses"}
+    READ_OPS = {"report_student", "course_stats", "report_course", "report_professor", "list_courses", "search", "sort",
+                "cache_stats", "analytics"}
+    WRITE_OPS = {"put", "delete"}
+    def __init__(self, app: CheckMyGradeApp, workers: int = 8):
+        self.app = app
+        self.lock = RWLock()
+        from concurrent.futures import ThreadPoolExecutor
+        self.pool = ThreadPoolExecutor(workers)
+    async def run(self, fn, *args):
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+    async def login(self, req: Dict):
+        import asyncio
+        async with self.lock.read():
+            u = await asyncio.wrap_future(self.app.auth.verify_async(req.get("email", ""), req.get("password", "")))
+        if u is None:
+            raise PermissionError("Invalid credentials.")
+        if PasswordHasher.needs_rehash(u.Password):
+            async with self.lock.write():
+                u = await self.run(self.app.rehash_password, u, req["password"])
+        return {"token": self.app.auth.open_session(u), "role": u.Role}
+    @staticmethod
+    def _int(req: Dict, name: str, default: Optional[int], low: int = 0) -> Optional[int]:
+        value = req.get(name, default)
+        if value is None and default is None:
+            return None
+        if isinstance(value, bool) or not isinstance(value, int) or value < low:
+            raise ValueError(f"{name} must be an integer >= {low}.")
+        return value
+    @staticmethod
+    def _str(req: Dict, name: str, default: Optional[str] = None) -> str:
+        value = req[name] if default is None else req.get(name, default)
+        if not isinstance(value, str):
+            raise ValueError(f"{name} must be a string.")
+        return value
+    def read(self, op: str, req: Dict, user: LoginUser):
+        app = self.app
+        if op == "report_student":
+            email = self._str(req, "email", user.User_id)
+            if user.Role != "professor" and email != user.User_id:
+                raise PermissionError("Students may only view their own report.")
+            return app.report_student(email)
+        if op == "course_stats":
+            return app.course_stats(self._str(req, "course"))
+        if op == "report_course":
+            return app.report_course_full(self._str(req, "course"))
+        if op == "report_professor":
+            return app.report_professor(self._str(req, "professor"))
+        if op == "list_courses":
+            return app.report_courses()
+        if op == "cache_stats":
+            return app.report_cache.stats()
+        if op == "analytics":
+            percentiles = req.get("percentiles", MarksDistribution.PERCENTILES)
+            if not isinstance(percentiles, (list, tuple)) or not all(
+                    isinstance(q, (int, float)) and not isinstance(q, bool) and 0 <= q <= 100 for q in percentiles):
+                raise ValueError("percentiles must be a list of numbers between 0 and 100.")
+            return app.analytics(percentiles, self._int(req, "width", 10, 1))
+        if op == "search":
+            res, ms = app.search_students(self._str(req, "query", ""), self._int(req, "limit", None),
+                                          bool(req.get("prefix", False)))
+            return {"students": self._student_dicts(res), "ms": ms}
+        course = req.get("course")
+        if course is not None:
+            course = self._str(req, "course")
+        res, ms = app.sort_students(self._str(req, "by", "email"), bool(req.get("descending", False)),
+                                    self._int(req, "offset", 0), self._int(req, "limit", 20), course)
+        return {"students": self._student_dicts(res), "ms": ms}
+    @staticmethod
+    def _student_dicts(res) -> List[Dict]:
+        return [s.asdict() if isinstance(s, StudentRow) else s._asdict() for s in res]
+    def write(self, op: str, req: Dict):
+        if op == "put":
+            rec = self.app.put_record(req["kind"], req["record"])
+            return rec.asdict() if isinstance(rec, StudentRow) else asdict(rec)
+        return self.app.drop_record(req["kind"], req["key"])
+    async def dispatch(self, req: Dict):
+        if not isinstance(req, dict):
+            raise ValueError("Request must be a JSON object.")
+        op = req.get("op")
+        if op == "login":
+            return await self.login(req)
+        user = self.app.auth.session(req.get("token", ""))
+        if user is None:
+            raise PermissionError("Login required.")
+        if user.Role != "professor" and op not in self.STUDENT_OPS:
+            raise PermissionError("Professor role required.")
+        if op == "logout":
+            self.app.auth.close_session(req["token"])
+            return True
+        if op in self.READ_OPS:
+            async with self.lock.read():
+                return await self.run(self.read, op, req, user)
+        if op in self.WRITE_OPS:
+            async with self.lock.write():
+                return await self.run(self.write, op, req)
+        raise ValueError(f"Unknown op: {op}")
+    async def handle(self, reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter"):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                t0 = time.perf_counter()
+                req: Dict = {}
+                try:
+                    req = json.loads(line)
+                    resp = {"ok": True, "result": await self.dispatch(req)}
+                except Exception as e:
+                    resp = {"ok": False, "error": str(e) or type(e).__name__}
+                resp["ms"] = (time.perf_counter() - t0) * 1000.0
+                if METRICS.enabled:
+                    op = req.get("op") if isinstance(req, dict) else None
+                    METRICS.record(f"GradeService.{op if isinstance(op, str) else 'request'}", resp["ms"] / 1000.0)
+                writer.write(json.dumps(resp).encode("utf-8") + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        import asyncio
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle, unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+    def serve_forever(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        import asyncio
+        async def main():
+            server = await self.start(host, port, unix_path)
+            async with server:
+                await server.serve_forever()
+        asyncio.run(main())
+
+def benchmark_logins(work_factors: Sequence[int] = (10_000, 100_000, 300_000), logins: int = 64,
+                     workers: int = 4, algorithm: str = "pbkdf2_sha256") -> Dict[int, float]:
+    results = {}
+    for work in work_factors:
+        users = {f"u{i}@bench": LoginUser(f"u{i}@bench", PasswordHasher.hash_password("pw", algorithm, work), "student")
+                 for i in range(workers)}
+        auth = Authenticator(users.get, workers)
+        t0 = time.perf_counter()
+        futures = [auth.verify_async(f"u{i % workers}@bench", "pw") for i in range(logins)]
+        ok = sum(1 for f in futures if f.result() is not None)
+        dt = time.perf_counter() - t0
+        auth.shutdown()
+        results[work] = ok / dt
+        print(f"[LOGIN {algorithm} work={work}] {results[work]:.1f} logins/sec")
+    return results
+
 if __name__ == "__main__":
-    app = CheckMyGradeApp("data")
-    minimum_info(app)
-    main_menu(app)
+    import argparse
+    parser = argparse.ArgumentParser(description="CheckMyGrade")
+    parser.add_argument("--data", default="data", help="data directory")
+    parser.add_argument("--to-snapshot", action="store_true", help="write data/snapshot.bin from the CSV files and exit")
+    parser.add_argument("--to-csv", action="store_true", help="rewrite the CSV files from data/snapshot.bin and exit")
+    parser.add_argument("--bench-login", action="store_true", help="report login throughput at several work factors and exit")
+    parser.add_argument("--serve", metavar="HOST:PORT", help="serve JSON-lines requests over TCP")
+    parser.add_argument("--unix", metavar="PATH", help="serve JSON-lines requests over a Unix socket")
+    parser.add_argument("--metrics", metavar="PATH", help="record operation metrics and write them to PATH on exit")
+    parser.add_argument("--backend", choices=("csv", "sqlite"), default="csv", help="storage backend")
+    parser.add_argument("--migrate-sqlite", action="store_true", help="copy the CSV files into data/checkmygrade.db and exit")
+    parser.add_argument("--compression", choices=("gzip", "lzma"), help="keep the CSV files gzip (.gz) or lzma (.xz) compressed")
+    parser.add_argument("--compress-data", action="store_true", help="write compressed copies of the plain CSV files and exit")
+    parser.add_argument("--check", action="store_true", help="report orphans, key mismatches and duplicate ids and exit")
+    parser.add_argument("--on-delete", choices=("none", "restrict", "cascade"), default="none",
+                        help="what deleting a course does to its students and professors")
+    args = parser.parse_args()
+    if args.metrics:
+        METRICS.enable()
+        atexit.register(METRICS.dump, args.metrics)
+    if args.bench_login:
+        benchmark_logins()
+    elif args.compress_data:
+        if not args.compression:
+            parser.error("--compress-data needs --compression")
+        for name, n in convert_csv_compression(args.data, args.compression).items():
+            print(f"{name}: {n} row(s) compressed.")
+    elif args.migrate_sqlite:
+        for name, n in migrate_csv_to_sqlite(args.data, args.compression).items():
+            print(f"{name}: {n} row(s) migrated.")
+    elif args.serve or args.unix:
+        app = CheckMyGradeApp(args.data, backend=args.backend, compression=args.compression)
+        minimum_info(app)
+        host, _, port = (args.serve or "127.0.0.1:8765").rpartition(":")
+        GradeService(app).serve_forever(host or "127.0.0.1", int(port), args.unix)
+    elif args.to_csv:
+        app = CheckMyGradeApp(args.data, backend=args.backend, compression=args.compression)
+        print("CSV files written." if app.snapshot_to_csv() else "No snapshot found.")
+    elif args.check:
+        app = CheckMyGradeApp(args.data, backend=args.backend, compression=args.compression)
+        for line in app.integrity.lines():
+            print(line)
+        print(app.integrity.summary())
+        sys.exit(0 if app.integrity.ok else 1)
+    elif args.to_snapshot:
+        app = CheckMyGradeApp(args.data, backend=args.backend, compression=args.compression)
+        app.write_snapshot()
+        print(f"Snapshot written to {app.snapshot_path}.")
+    else:
+        app = CheckMyGradeApp(args.data, backend=args.backend, compression=args.compression)
+        app.delete_rule = args.on_delete
+        minimum_info(app)
+        main_menu(app)
 
 
 
@@ -1,4 +1,6 @@
 import os
+import random
+import statistics
 import unittest
 import tempfile
 from unittest.mock import patch
@@ -11,7 +13,19 @@ from DATA_200_LAB_1 import (
     Course,
     Professor,
     Grades,
+    GradeService,
+    IntegrityError,
+    CSVstore,
+    LoginUser,
+    METRICS,
+    PasswordHasher,
+    StoreConflictError,
+    convert_csv_compression,
+    migrate_csv_to_sqlite,
     minimum_info,
+    paginate,
+    professor_menu,
+    write_lines,
 )
 
 def make_input_side_effect(values):
@@ -152,6 +166,715 @@ class TestCheckMyGrade(unittest.TestCase):
         self.assertTrue(ms2 >= 0)
         self.assertGreaterEqual(lst2[0].Email_address, lst2[-1].Email_address)
 
+    def test_journal_replay_and_compaction(self):
+        with patch("builtins.input", side_effect=make_input_side_effect([
+            "j1@x.com", "Jo", "Lee", "DATA200", "75"
+        ])):
+            self.app.add_student()
+        store = self.app.students_store
+        self.assertTrue(os.path.exists(store.journal_path))
+        with patch("builtins.input", side_effect=make_input_side_effect([
+            "j1@x.com", "", "", "", "55"
+        ])):
+            self.app.update_student()
+        app2 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertEqual(app2.students["j1@x.com"].Marks, 55)
+
+        with patch("builtins.input", side_effect=make_input_side_effect(["j1@x.com"])):
+            app2.delete_student()
+        app3 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertNotIn("j1@x.com", app3.students)
+
+        with open(store.journal_path, "a", newline="") as f:
+            f.write("upsert,t@x.com,T,U,DATA200,A,8")
+        app4 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertNotIn("t@x.com", app4.students)
+        with open(store.journal_path, "a", newline="") as f:
+            f.write("upsert,b@x.com,B,C,DATA2")
+        self.assertEqual(len(CheckMyGradeApp(self.tmpdir.name).students), len(app3.students))
+        app4.students_store.upsert({"Email_address": "b@x.com", "First_name": "B", "Last_name": "C",
+                                    "Course_id": "DATA200", "grades": "A", "Marks": 90})
+        app5 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertEqual(app5.students["b@x.com"].Marks, 90)
+        self.assertNotIn("t@x.com", app5.students)
+
+        store.JOURNAL_MIN_ROWS = 2
+        for i in range(5):
+            store.upsert({"Email_address": f"c{i}@x.com", "First_name": "C", "Last_name": "D",
+                          "Course_id": "DATA200", "grades": "A", "Marks": 80})
+        self.assertLessEqual(store.journal_rows, 2)
+        self.assertEqual(len(CheckMyGradeApp(self.tmpdir.name).students), len(app3.students) + 6)
+
+    def test_course_index_follows_mutations(self):
+        self.app.students["ix@x.com"] = Student("ix@x.com", "I", "X", "DATA201", Grades.letter_for(60), 60)
+        self.assertIn("1 student(s) in DATA201", self.app.course_stats("DATA201"))
+        with patch("builtins.input", side_effect=make_input_side_effect([
+            "ix@x.com", "", "", "DATA300", ""
+        ])):
+            self.app.update_student()
+        self.assertEqual(self.app.course_stats("DATA201"), "0 student(s) in DATA201")
+        self.assertIn("ix@x.com", self.app.report_course_full("DATA300"))
+        del self.app.students["ix@x.com"]
+        self.assertEqual(self.app.course_index.students_in("DATA300"), [])
+
+    def test_course_stats_match_full_recompute(self):
+        rnd = random.Random(7)
+        for i in range(300):
+            m = rnd.randint(0, 100)
+            self.app.students[f"st{i}@x.com"] = Student(f"st{i}@x.com", "S", "T", rnd.choice(["C1", "C2"]), Grades.letter_for(m), m)
+        for i in range(0, 300, 3):
+            del self.app.students[f"st{i}@x.com"]
+        for i in range(1, 300, 5):
+            m = rnd.randint(0, 100)
+            self.app.students[f"st{i}@x.com"] = Student(f"st{i}@x.com", "S", "T", "C2", Grades.letter_for(m), m)
+        for cid in ("C1", "C2"):
+            marks = [s.Marks for s in self.app.students.values() if s.Course_id == cid]
+            expected = (f"{len(marks)} student(s) in {cid}\nAvg={round(sum(marks)/len(marks), 2)} , "
+                        f"Median={statistics.median(marks)} , Min={min(marks)} , Max={max(marks)}")
+            self.assertEqual(self.app.course_stats(cid), expected)
+            self.assertTrue(self.app.report_course_full(cid).endswith(expected.split("\n")[1]))
+        st = self.app.stats_index.get("C2")
+        self.assertEqual(len(st.counts), 101)
+        for m in (-5, 105, 50):
+            st.add(m)
+        self.assertEqual((st.min(), st.max()), (-5, 105))
+        for m in (-5, 105, 50):
+            st.remove(m)
+        self.assertEqual(self.app.course_stats("C2"), expected)
+
+    def test_indexed_search_matches_linear_scan(self):
+        for i in range(500):
+            email = f"User{i}@Campus{i % 7}.edu"
+            self.app.students[email] = Student(email, f"Name{i}", "Smith" if i % 2 else "Jones", "DATA200", "A", 85)
+        del self.app.students["User10@Campus3.edu"]
+        for q in ("user1", "CAMPUS3", "0@", "u", "", "zzz", "r10@c"):
+            res, ms = self.app.search_students(q)
+            expected = sorted(s.Email_address for s in self.app.students.values() if q.lower() in s.Email_address.lower())
+            self.assertEqual(sorted(s.Email_address for s in res), expected)
+            self.assertTrue(ms >= 0)
+        res, _ = self.app.search_students("user4", limit=5)
+        self.assertEqual(len(res), 5)
+        res, _ = self.app.search_students("user12", prefix=True)
+        self.assertEqual(sorted(s.Email_address for s in res),
+                         sorted(e for e in self.app.students if e.lower().startswith("user12")))
+        self.assertEqual(list(self.app.search_index.grams), ["Email_address"])
+        self.assertEqual(sorted(self.app.students.keys()), sorted(self.app.students))
+        self.assertEqual(dict(self.app.students)["User3@Campus3.edu"].First_name, "Name3")
+        snap = self.app.students.copy()
+        popped = self.app.students.pop("User3@Campus3.edu")
+        self.assertEqual((popped.First_name, popped.Marks), ("Name3", 85))
+        self.assertEqual(snap["User3@Campus3.edu"], popped)
+        self.assertNotIn("User3@Campus3.edu", self.app.students)
+        self.assertIsNone(self.app.students.pop("User3@Campus3.edu", None))
+        key, last = self.app.students.popitem()
+        self.assertEqual((key, last.Email_address), ("User499@Campus2.edu", "User499@Campus2.edu"))
+        self.app.students[key] = last
+        self.app.students["User3@Campus3.edu"] = popped
+        res, _ = self.app.search_students("mit", fields=("Last_name",))
+        self.assertEqual(len(res), 250)
+        self.app.students["User11@Campus4.edu"].Last_name = "Jonesmith"
+        res, _ = self.app.search_students("esmi", fields=("Last_name",))
+        self.assertEqual([s.Email_address for s in res], ["User11@Campus4.edu"])
+        res, _ = self.app.search_students("user", limit=3)
+        self.assertEqual([s.Email_address for s in res], sorted((e for e in self.app.students if "user" in e.lower()), key=str.lower)[:3])
+
+    def test_columnar_students_use_less_memory_than_dataclasses(self):
+        import gc, tracemalloc
+        from Benchmark_Lab1 import generate_roster
+        d = os.path.join(self.tmpdir.name, "roster")
+        generate_roster(d, 20_000, 20)
+        app = CheckMyGradeApp(d)
+
+        def retained(fn):
+            gc.collect()
+            tracemalloc.start()
+            kept = fn()
+            gc.collect()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return kept, size
+
+        _, columnar = retained(lambda: app.load_students() or app)
+        _, dataclasses = retained(lambda: {r["Email_address"]: Student(r["Email_address"], r["First_name"], r["Last_name"],
+                                                                      r["Course_id"], r["grades"], int(r["Marks"]))
+                                           for r in app.students_store.read_all()})
+        self.assertLess(columnar, 0.9 * dataclasses, (columnar, dataclasses))
+        app.auth.shutdown()
+
+    def test_sorted_views_pagination_and_top_k(self):
+        for i in range(120):
+            email = f"p{i:03d}@u.edu"
+            marks = (i * 37) % 100
+            self.app.students[email] = Student(email, "P", "Q", "DATA200" if i % 2 else "DATA201", Grades.letter_for(marks), marks)
+        for i in range(0, 120, 4):
+            self.app.students[f"p{i:03d}@u.edu"] = Student(f"p{i:03d}@u.edu", "P", "Q", "DATA201", "A+", 99 - i % 10)
+        full = sorted(self.app.students.values(), key=lambda s: (s.Marks, s.Email_address), reverse=True)
+        page, _ = self.app.sort_students("marks", True, offset=10, limit=15)
+        self.assertEqual(page, full[10:25])
+        by_email, _ = self.app.sort_students("email", False)
+        self.assertEqual([s.Email_address for s in by_email], sorted(s.Email_address for s in self.app.students.values()))
+        low, _ = self.app.top_students(20, course="DATA200", lowest=True)
+        expected = sorted((s for s in self.app.students.values() if s.Course_id == "DATA200"), key=lambda s: (s.Marks, s.Email_address))[:20]
+        self.assertEqual(low, expected)
+
+    def test_columnar_rows_keep_student_api(self):
+        self.app.students["col@x.com"] = Student("col@x.com", "Col", "Umn", "DATA200", "B", 75)
+        row = self.app.students["col@x.com"]
+        self.assertEqual(row, Student("col@x.com", "Col", "Umn", "DATA200", "B", 75))
+        row.Marks = 40
+        row.Course_id = "DATA205"
+        self.assertEqual(self.app.students["col@x.com"].Marks, 40)
+        self.assertIn("1 student(s) in DATA205", self.app.course_stats("DATA205"))
+        self.assertEqual(self.app.top_students(1, lowest=True)[0][0].Email_address, "col@x.com")
+        slots = len(self.app.students.marks)
+        del self.app.students["col@x.com"]
+        self.app.students["col2@x.com"] = Student("col2@x.com", "Col", "Two", "DATA200", "A", 85)
+        self.assertEqual(len(self.app.students.marks), slots)
+        self.assertEqual(self.app.students.course_names.count("DATA200"), 1)
+
+    def test_snapshot_round_trip_and_staleness(self):
+        for i in range(50):
+            self.app.students[f"sn{i}@x.com"] = Student(f"sn{i}@x.com", "Sn", "Ap", f"C{i % 3}", "A", 80 + i % 10)
+        self.app.save_students()
+        self.app.write_snapshot()
+        app2 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertTrue(app2.load_snapshot())
+        self.assertEqual(sorted(app2.students), sorted(self.app.students))
+        self.assertEqual(app2.students["sn7@x.com"], self.app.students["sn7@x.com"])
+        self.assertEqual(app2.course_stats("C1"), self.app.course_stats("C1"))
+        self.assertEqual(set(app2.courses), set(self.app.courses))
+
+        self.app.students_store.upsert({"Email_address": "late@x.com", "First_name": "L", "Last_name": "A",
+                                        "Course_id": "C1", "grades": "A", "Marks": 85})
+        self.assertFalse(app2.load_snapshot())
+        self.assertIn("late@x.com", CheckMyGradeApp(self.tmpdir.name).students)
+
+        os.remove(self.app.students_store.journal_path)
+        with open(self.app.students_store.path, "w") as f:
+            f.write("Email_address,First_name,Last_name,Course_id,grades,Marks\n")
+        self.assertTrue(self.app.snapshot_to_csv())
+        self.assertEqual(len(CheckMyGradeApp(self.tmpdir.name).students), len(app2.students))
+
+    def test_parallel_chunked_load_matches_sequential(self):
+        with open(self.app.students_store.path, "a", newline="") as f:
+            for i in range(400):
+                f.write(f"dup{i % 150}@x.com,F{i},L{i},DATA{i % 4},A,{i % 101}\r\n")
+        sequential = CheckMyGradeApp(self.tmpdir.name, load_workers=1)
+        store = sequential.students_store
+        ranges = store.chunk_ranges(512)
+        self.assertGreater(len(ranges), 3)
+        self.assertEqual(ranges[-1][1], os.path.getsize(store.path))
+        with patch.object(type(store), "PARALLEL_MIN_BYTES", 0), patch.object(type(store), "CHUNK_BYTES", 512):
+            parallel = CheckMyGradeApp(self.tmpdir.name, load_workers=2, lazy=False)
+        self.assertEqual(list(parallel.students), list(sequential.students))
+        self.assertEqual(parallel.students["dup7@x.com"], sequential.students["dup7@x.com"])
+        self.assertEqual(parallel.students["dup7@x.com"].First_name, "F307")
+        sequential.import_students([{"Email_address": f"nl{i}@x.com", "First_name": "Line1\nLine2, \"q\"", "Last_name": "N",
+                                   "Course_id": "DATA200", "Marks": "70"} for i in range(60)])
+        sequential = CheckMyGradeApp(self.tmpdir.name, load_workers=1)
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(store.chunk_ranges(300), store.chunk_ranges(300)[1:])))
+        with patch.object(type(store), "PARALLEL_MIN_BYTES", 0), patch.object(type(store), "CHUNK_BYTES", 300):
+            parallel = CheckMyGradeApp(self.tmpdir.name, load_workers=2, lazy=False)
+        self.assertEqual([s.astuple() for s in parallel.students.values()], [s.astuple() for s in sequential.students.values()])
+        self.assertEqual(parallel.students["nl5@x.com"].First_name, "Line1\nLine2, \"q\"")
+
+    def test_bulk_import_and_filtered_export(self):
+        records = [{"Email_address": f"b{i}@x.com", "First_name": "B", "Last_name": str(i),
+                    "Course_id": "DATA200" if i % 2 else "DATA201", "Marks": str(i % 101)} for i in range(1000)]
+        records.append({"Email_address": "bad@x.com", "Course_id": "DATA200", "Marks": "lots"})
+        records.append(Student("obj@x.com", "O", "B", "DATA201", "", 91))
+        with patch.object(self.app.students_store, "write_all", wraps=self.app.students_store.write_all) as w:
+            result = self.app.import_students(records)
+        self.assertEqual(w.call_count, 1)
+        self.assertEqual((result["added"], result["updated"], len(result["errors"])), (1001, 0, 1))
+        self.assertEqual(self.app.students["b95@x.com"].grades, Grades.letter_for(95))
+        self.assertEqual(self.app.students["obj@x.com"].grades, "A+")
+        self.assertEqual(len(self.app.search_students("b99")[0]), 11)
+
+        path = os.path.join(self.tmpdir.name, "a_plus.csv")
+        n = self.app.export_students(path, course="DATA201", grade="A+")
+        app2 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertEqual(len(app2.students), len(self.app.students))
+        check = CheckMyGradeApp(os.path.join(self.tmpdir.name, "empty"))
+        self.assertEqual(check.import_students(path)["added"], n)
+        self.assertTrue(all(s.grades == "A+" and s.Course_id == "DATA201" for s in check.students.values()))
+
+        self.assertEqual(self.app.import_courses([{"Course_id": "CS1", "Credits": "x"}], strict=True)["added"], 0)
+        self.assertEqual(self.app.import_courses([{"Course_id": "CS1", "Course_name": "One"}])["added"], 1)
+        self.assertEqual(CheckMyGradeApp(self.tmpdir.name).courses["CS1"].Credits, 3)
+
+    def test_batch_defers_writes_and_rolls_back(self):
+        store = self.app.students_store
+        with patch.object(store, "write_all", wraps=store.write_all) as w, \
+                patch.object(store, "upsert", wraps=store.upsert) as up:
+            with self.app.batch():
+                for i in range(3):
+                    with patch("builtins.input", side_effect=make_input_side_effect([
+                        f"bt{i}@x.com", "B", "T", "DATA200", "70"
+                    ])):
+                        self.app.add_student()
+                with patch("builtins.input", side_effect=make_input_side_effect(["bt0@x.com"])):
+                    self.app.delete_student()
+                self.assertEqual(w.call_count, 0)
+            self.assertEqual((w.call_count, up.call_count), (1, 0))
+        self.assertFalse(os.path.exists(store.path + ".tmp"))
+        app2 = CheckMyGradeApp(self.tmpdir.name)
+        self.assertIn("bt2@x.com", app2.students)
+        self.assertNotIn("bt0@x.com", app2.students)
+
+        before = self.app.course_stats("DATA200")
+        with self.assertRaises(RuntimeError):
+            with self.app.batch():
+                self.app.students["bt1@x.com"].Marks = 5
+                del self.app.students["bt2@x.com"]
+                self.app.students["bt9@x.com"] = Student("bt9@x.com", "B", "T", "DATA200", "F", 1)
+                self.app.courses["DATA200"].Credits = 9
+                raise RuntimeError("boom")
+        self.assertEqual(self.app.students["bt1@x.com"].Marks, 70)
+        self.assertIn("bt2@x.com", self.app.students)
+        self.assertNotIn("bt9@x.com", self.app.students)
+        self.assertEqual(self.app.courses["DATA200"].Credits, 1)
+        self.assertEqual(self.app.course_stats("DATA200"), before)
+
+        self.app.courses
+        other = CheckMyGradeApp(self.tmpdir.name, lazy=False)
+        other.put_record("courses", {"Course_id": "DATA777", "Course_name": "Other", "Description": "", "Credits": "3"})
+        other.save_courses()
+        with self.assertRaises(StoreConflictError):
+            with self.app.batch():
+                self.app.put_record("students", {"Email_address": "bt55@x.com", "First_name": "B", "Last_name": "T",
+                                                 "Course_id": "DATA200", "Marks": "70"})
+                self.app.put_record("courses", {"Course_id": "DATA555", "Course_name": "Mine", "Description": "", "Credits": "3"})
+        self.assertNotIn("bt55@x.com", self.app.students)
+        self.assertNotIn("DATA555", self.app.courses)
+        fresh = CheckMyGradeApp(self.tmpdir.name)
+        self.assertNotIn("bt55@x.com", fresh.students)
+        self.assertEqual(("DATA555" in fresh.courses, "DATA777" in fresh.courses), (False, True))
+
+    def test_salted_kdf_sessions_and_legacy_upgrade(self):
+        import hashlib
+        h1, h2 = PasswordHasher.hash_password("pw"), PasswordHasher.hash_password("pw")
+        self.assertNotEqual(h1, h2)
+        self.assertTrue(PasswordHasher.verify_password("pw", h1))
+        self.assertFalse(PasswordHasher.verify_password("nope", h1))
+        scrypt = PasswordHasher.hash_password("pw", "scrypt", 2 ** 10)
+        self.assertTrue(PasswordHasher.verify_password("pw", scrypt))
+
+        legacy = hashlib.sha256(b"old-pass").hexdigest()
+        self.app.users["legacy@x.com"] = LoginUser("legacy@x.com", legacy, "student")
+        self.assertIsNone(self.app.login("legacy@x.com", "wrong"))
+        self.assertIsNotNone(self.app.login("legacy@x.com", "old-pass"))
+        self.assertTrue(CheckMyGradeApp(self.tmpdir.name).users["legacy@x.com"].Password.startswith("pbkdf2_sha256$"))
+
+        token = self.app.authenticate("prof@mycsu.edu", "Welcome12#_")
+        self.assertIsNotNone(token)
+        self.assertEqual(self.app.session_user(token).Role, "professor")
+        self.assertIsNone(self.app.authenticate("prof@mycsu.edu", "bad"))
+        self.app.auth.session_ttl = -1
+        self.assertIsNone(self.app.session_user(self.app.authenticate("prof@mycsu.edu", "Welcome12#_")))
+        for _ in range(50):
+            self.app.auth.open_session(self.app.users["prof@mycsu.edu"])
+        self.assertEqual(len(self.app.auth.sessions), 2)
+        self.assertEqual(len(self.app.auth._expiry), 2)
+        self.app.auth.shutdown()
+
+    def test_service_concurrent_clients(self):
+        import asyncio, json
+        self.app.register_user("stud@x.com", "pw", "student")
+        self.app.students["stud@x.com"] = Student("stud@x.com", "S", "T", "DATA200", "A", 85)
+
+        async def call(port, **req):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(json.dumps(req).encode() + b"\n")
+            await writer.drain()
+            resp = json.loads(await reader.readline())
+            writer.close()
+            await writer.wait_closed()
+            return resp
+
+        async def session(port, *lines):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            out = []
+            for line in lines:
+                writer.write((line if isinstance(line, str) else json.dumps(line)).encode() + b"\n")
+                await writer.drain()
+                out.append(json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+            return out
+
+        async def scenario():
+            service = GradeService(self.app)
+            server = await service.start("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            ptok = (await call(port, op="login", email="prof@mycsu.edu", password="Welcome12#_"))["result"]["token"]
+            stok = (await call(port, op="login", email="stud@x.com", password="pw"))["result"]["token"]
+            put = await call(port, op="put", token=ptok, kind="students",
+                             record={"Email_address": "svc@x.com", "First_name": "S", "Last_name": "V", "Course_id": "DATA200", "Marks": 77})
+            stats, mine, denied, search = await asyncio.gather(
+                call(port, op="course_stats", token=stok, course="DATA200"),
+                call(port, op="report_student", token=stok),
+                call(port, op="delete", token=stok, kind="students", key="svc@x.com"),
+                call(port, op="search", token=ptok, query="svc"))
+            anon = await call(port, op="search", query="svc")
+            bad = await session(port, "[1,2]", "not json", {"op": "course_stats", "token": ptok, "course": 5},
+                                {"op": "sort", "token": ptok, "limit": "10"}, {"op": "analytics", "token": ptok, "width": 0},
+                                {"op": "course_stats", "token": ptok}, {"op": "list_courses", "token": ptok})
+            server.close()
+            await server.wait_closed()
+            service.pool.shutdown()
+            return put, stats, mine, denied, search, anon, bad
+
+        put, stats, mine, denied, search, anon, bad = asyncio.run(scenario())
+        self.assertEqual([r["ok"] for r in bad], [False] * 6 + [True])
+        self.assertTrue(all(r["error"] for r in bad[:6]))
+        self.assertTrue(put["ok"])
+        self.assertEqual(put["result"]["grades"], "B")
+        self.assertIn("student(s) in DATA200", stats["result"])
+        self.assertIn("stud@x.com", mine["result"])
+        self.assertFalse(denied["ok"])
+        self.assertEqual([s["Email_address"] for s in search["result"]["students"]], ["svc@x.com"])
+        self.assertGreaterEqual(search["ms"], 0)
+        self.assertEqual(anon["error"], "Login required.")
+        self.assertIn("svc@x.com", CheckMyGradeApp(self.tmpdir.name).students)
+
+    def test_shared_directory_refresh_and_conflicts(self):
+        other = CheckMyGradeApp(self.tmpdir.name, lazy=False)
+        self.assertEqual(other.refresh(), [])
+        with patch("builtins.input", side_effect=make_input_side_effect([
+            "shared@x.com", "Sh", "Ared", "DATA200", "64"
+        ])):
+            self.app.add_student()
+        self.assertEqual(self.app.refresh(), [])
+        self.assertNotIn("shared@x.com", other.students)
+        self.assertEqual(other.refresh(), ["students"])
+        self.assertEqual(other.students["shared@x.com"].Marks, 64)
+        self.assertEqual(other.course_stats("DATA200"), self.app.course_stats("DATA200"))
+
+        self.app.students["only_here@x.com"] = Student("only_here@x.com", "O", "H", "DATA200", "A", 85)
+        self.app.save_students()
+        other.students["lost@x.com"] = Student("lost@x.com", "L", "O", "DATA200", "A", 85)
+        with self.assertRaises(StoreConflictError):
+            other.save_students()
+        self.assertEqual(other.refresh(), ["students"])
+        self.assertIn("only_here@x.com", other.students)
+        other.save_students()
+        self.assertTrue(os.path.exists(self.app.students_store.lock_path))
+
+    def test_benchmark_suite_flags_regressions(self):
+        from Benchmark_Lab1 import OPERATIONS, compare, run_benchmarks
+        results = run_benchmarks([200], n_courses=5, repeat=1, warmup=0)
+        self.assertEqual(set(results["results"]["200"]), set(OPERATIONS))
+        self.assertEqual(compare(results, results), [])
+        faster = {"results": {"200": {"login": {"median_ms": results["results"]["200"]["login"]["median_ms"] / 10}}}}
+        self.assertEqual(len(compare(results, faster)), 1)
+        rss = results["peak_rss_mb"]["200"]
+        self.assertGreater(rss, 0)
+        self.assertEqual(len(compare(results, {"peak_rss_mb": {"200": rss / 2}})), 1)
+
+    def test_metrics_registry_records_and_restores(self):
+        plain = CheckMyGradeApp.search_students
+        METRICS.reset()
+        METRICS.enable()
+        try:
+            for i in range(20):
+                self.app.students[f"m{i}@x.com"] = Student(f"m{i}@x.com", "M", "E", "DATA200", "A", 80)
+            for _ in range(5):
+                self.app.search_students("m1")
+            self.app.save_students()
+            CheckMyGradeApp(self.tmpdir.name).load_all()
+            snap = METRICS.snapshot()
+        finally:
+            METRICS.disable()
+        self.assertIs(CheckMyGradeApp.search_students, plain)
+        search = snap["CheckMyGradeApp.search_students"]
+        self.assertEqual(search["calls"], 5)
+        self.assertGreater(search["rows"], 0)
+        self.assertLessEqual(search["p50_ms"], search["p99_ms"])
+        self.assertGreater(snap["CSVstore.write_all"]["bytes_written"], 0)
+        self.assertGreater(snap["CSVstore.read_base"]["bytes_read"], 0)
+        self.assertIn("CheckMyGradeApp.load_all", snap)
+        path = os.path.join(self.tmpdir.name, "metrics.json")
+        METRICS.dump(path)
+        self.assertTrue(os.path.getsize(path) > 0)
+        self.assertIn("CheckMyGradeApp.search_students", METRICS.report())
+        METRICS.reset()
+
+    def test_bulk_letters_and_regrade_after_scale_change(self):
+        marks = list(range(-5, 106))
+        self.assertEqual(Grades.letters_for(marks), [Grades.letter_for(m) for m in marks])
+        for i in range(100):
+            self.app.students[f"g{i}@x.com"] = Student(f"g{i}@x.com", "G", "R", "DATA200" if i % 2 else "DATA201", Grades.letter_for(i), i)
+        self.assertEqual(self.app.regrade(), 0)
+        old_scale = Grades.SCALE
+        Grades.SCALE = [(85, "A+"), (70, "A"), (60, "B"), (50, "C"), (40, "D"), (0, "F")]
+        try:
+            self.assertEqual(Grades.letters_for([85, 84, 39]), ["A+", "A", "F"])
+            expected = sum(1 for i in range(1, 100, 2) if Grades.letter_for(i) != self.app.students[f"g{i}@x.com"].grades)
+            with patch.object(self.app.students_store, "write_all", wraps=self.app.students_store.write_all) as w:
+                self.assertEqual(self.app.regrade("DATA200"), expected)
+            self.assertEqual(w.call_count, 1)
+            self.assertEqual(self.app.students["g87@x.com"].grades, "A+")
+            self.assertEqual(self.app.students["g86@x.com"].grades, "A")
+            self.assertGreater(self.app.regrade(), 0)
+            self.assertEqual(CheckMyGradeApp(self.tmpdir.name).students["g86@x.com"].grades, "A+")
+        finally:
+            Grades.SCALE = old_scale
+
+    def test_sqlite_backend_matches_csv_and_pushes_down_queries(self):
+        for i in range(60):
+            self.app.students[f"q{i}@x.com"] = Student(f"q{i}@x.com", "Q", "L", "DATA200" if i % 3 else "DATA201", Grades.letter_for(i + 40), i + 40)
+        self.app.save_students()
+        counts = migrate_csv_to_sqlite(self.tmpdir.name)
+        self.assertEqual(counts["students"], len(self.app.students))
+        db = CheckMyGradeApp(self.tmpdir.name, backend="sqlite")
+        self.assertEqual(sorted(s.astuple() for s in db.students.values()), sorted(s.astuple() for s in self.app.students.values()))
+        self.assertEqual(set(db.courses), set(self.app.courses))
+        store = db.students_store
+        for cid in ("DATA200", "DATA201"):
+            st = self.app.stats_index.get(cid)
+            self.assertEqual(store.course_stats(cid), (st.count, st.avg(), st.median(), st.min(), st.max()))
+        self.assertIsNone(store.course_stats("NOPE"))
+        sql = []
+        store.conn.set_trace_callback(sql.append)
+        store.course_stats("DATA200")
+        store.conn.set_trace_callback(None)
+        self.assertEqual((sql[0], sql[-1], len(sql)), ("BEGIN", "COMMIT", 4))
+        self.assertFalse(store.conn.in_transaction)
+        res, _ = self.app.search_students("q1", limit=5)
+        self.assertEqual([r["Email_address"] for r in store.search("q1", limit=5)], [s.Email_address for s in res])
+        res, _ = self.app.sort_students("marks", True, 3, 10, course="DATA200")
+        self.assertEqual([r["Email_address"] for r in store.sort("marks", True, 3, 10, course="DATA200")], [s.Email_address for s in res])
+        lazy = CheckMyGradeApp(self.tmpdir.name, backend="sqlite", lazy=True)
+        for cid in ("DATA200", "DATA201", "NOPE"):
+            self.assertEqual(lazy.course_stats(cid), self.app.course_stats(cid))
+        for args in (("q1", 5), ("Q2", None)):
+            expected = [s.Email_address for s in self.app.search_students(*args)[0]]
+            self.assertEqual([s.Email_address for s in lazy.search_students(*args)[0]], expected)
+        for by in ("marks", "email"):
+            expected = [s.Email_address for s in self.app.sort_students(by, True, 2, 7)[0]]
+            self.assertEqual([s.Email_address for s in lazy.sort_students(by, True, 2, 7)[0]], expected)
+        self.assertFalse(lazy.loaded("students"))
+        db.put_record("students", {"Email_address": "new@x.com", "First_name": "N", "Last_name": "W", "Course_id": "DATA200", "grades": "A", "Marks": "95"})
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "Student.csv.journal")))
+        self.assertEqual(store.get("new@x.com")["Marks"], 95)
+        other = CheckMyGradeApp(self.tmpdir.name, backend="sqlite")
+        self.assertIn("new@x.com", other.students)
+        other.drop_record("students", "new@x.com")
+        self.assertTrue(db.refresh())
+        self.assertNotIn("new@x.com", db.students)
+        other.students["late@x.com"] = Student("late@x.com", "L", "T", "DATA200", "B", 81)
+        db.students["conflict@x.com"] = Student("conflict@x.com", "C", "F", "DATA200", "B", 82)
+        other.save_students()
+        with self.assertRaises(StoreConflictError):
+            db.save_students()
+
+    def test_report_cache_hits_and_precise_invalidation(self):
+        for i in range(20):
+            self.app.students[f"c{i}@x.com"] = Student(f"c{i}@x.com", "C", "K", "DATA200" if i % 2 else "DATA201", "B", 80)
+        self.app.professors["p201@x.com"] = Professor("p201@x.com", "P", "Prof", "DATA201")
+        cache = self.app.report_cache
+        cache.clear()
+        r200, r201 = self.app.report_course_full("DATA200"), self.app.report_course_full("DATA201")
+        prof, listing = self.app.report_professor("p201@x.com"), self.app.report_courses()
+        self.app.report_student("c1@x.com")
+        misses = cache.stats()["misses"]
+        self.assertIs(self.app.report_course_full("DATA200"), r200)
+        self.assertIs(self.app.report_professor("p201@x.com"), prof)
+        self.assertEqual(cache.stats()["misses"], misses)
+        self.assertEqual(cache.stats()["hits"], 2)
+        self.app.put_record("students", {"Email_address": "c1@x.com", "First_name": "C", "Last_name": "K", "Course_id": "DATA201", "grades": "A", "Marks": "95"})
+        self.assertNotIn(("course", "DATA200"), cache.entries)
+        self.assertNotIn(("course", "DATA201"), cache.entries)
+        self.assertNotIn(("professor", "p201@x.com"), cache.entries)
+        self.assertNotIn(("student", "c1@x.com"), cache.entries)
+        self.assertIn(("courses",), cache.entries)
+        self.assertIn("c1@x.com", self.app.report_course_full("DATA201"))
+        self.assertNotIn("c1@x.com", self.app.report_course_full("DATA200"))
+        self.assertIn("| 95 (", self.app.report_student("c1@x.com"))
+        with patch("builtins.input", side_effect=make_input_side_effect(["p201@x.com", "Renamed", "", ""])):
+            self.app.update_professor()
+        self.assertIn("Renamed", self.app.report_professor("p201@x.com"))
+        self.assertIn(("course", "DATA201"), cache.entries)
+        self.app.put_record("courses", {"Course_id": "DATA300", "Course_name": "New", "Description": "", "Credits": "3"})
+        self.assertIn("DATA300", self.app.report_courses())
+        self.app.import_courses([{"Course_id": "DATA301", "Course_name": "Imported"}])
+        self.assertIn("DATA301", self.app.report_courses())
+        self.app.import_professors([{"Professor_id": "p201@x.com", "Professor_Name": "Imported Name", "Rank": "Prof", "Course_id": "DATA201"}])
+        self.assertIn("Imported Name", self.app.report_professor("p201@x.com"))
+        for n in range(2):
+            self.app.import_students([{"Email_address": f"bulk{n}_{i}@x.com", "First_name": "B", "Last_name": "K",
+                                       "Course_id": "DATA200", "Marks": "70"} for i in range(len(self.app.students))])
+        self.assertEqual(sum(1 for w in self.app.students.watchers if w is cache), 1)
+        small = type(cache)(capacity=2)
+        for i in range(3):
+            small.get(("student", str(i)), lambda: "x", [("student", str(i))])
+        self.assertEqual(small.stats()["evictions"], 1)
+        self.assertNotIn(("student", "0"), small.entries)
+        self.assertEqual(set(small.tags), {("student", "1"), ("student", "2")})
+
+    def test_group_by_analytics_single_pass(self):
+        rnd = random.Random(19)
+        for i in range(500):
+            m = rnd.randint(0, 100)
+            self.app.students[f"a{i}@x.com"] = Student(f"a{i}@x.com", "A", "N", f"DATA{200 + i % 4}", Grades.letter_for(m), m)
+        del self.app.students["a3@x.com"]
+        self.app.professors["p202@x.com"] = Professor("p202@x.com", "P", "Prof", "DATA202")
+        data = self.app.analytics(percentiles=(25, 50, 90))
+        for cid, stats in data["courses"].items():
+            marks = [s.Marks for s in self.app.students.values() if s.Course_id == cid]
+            self.assertEqual(stats["count"], len(marks))
+            self.assertEqual(stats["mean"], round(statistics.fmean(marks), 2))
+            self.assertEqual(stats["median"], statistics.median(marks))
+            self.assertEqual(stats["std"], round(statistics.pstdev(marks), 2))
+            q = statistics.quantiles(marks, n=4, method="inclusive")
+            self.assertAlmostEqual(stats["percentiles"]["p25"], q[0], places=2)
+            self.assertEqual(stats["percentiles"]["p50"], stats["median"])
+            self.assertEqual(sum(stats["letters"].values()), len(marks))
+            self.assertEqual(stats["letters"]["A+"], sum(1 for m in marks if m >= 90))
+            self.assertEqual(sum(stats["histogram"].values()), len(marks))
+            self.assertEqual(stats["histogram"]["90-100"], sum(1 for m in marks if m >= 90))
+        self.assertEqual(data["overall"]["count"], len(self.app.students))
+        self.assertEqual(data["professors"]["p202@x.com"], data["courses"]["DATA202"])
+        text = self.app.report_analytics()
+        self.assertIn("Course DATA202", text)
+        self.assertIn("Professor p202@x.com (DATA202)", text)
+
+    def test_streaming_reports_and_pagination(self):
+        for i in range(250):
+            self.app.students[f"r{i:03}@x.com"] = Student(f"r{i:03}@x.com", "R", "S", "DATA200", "B", 75)
+        self.app.professors["p200@x.com"] = Professor("p200@x.com", "P", "Prof", "DATA200")
+        lines = self.app.iter_course_report("DATA200")
+        self.assertEqual(next(lines), f"{self.app.course_index.count('DATA200')} student(s) in DATA200")
+        self.assertEqual("\n".join(self.app.iter_course_report("DATA200")), self.app.report_course_full("DATA200"))
+        self.assertEqual("\n".join(self.app.iter_professor_report("p200@x.com")), self.app.report_professor("p200@x.com"))
+        self.assertEqual(list(self.app.iter_professor_report("nobody")), ["No record."])
+        res, _ = self.app.search_students("r1")
+        self.assertEqual([s.Email_address for s in self.app.iter_search_students("r1")], [s.Email_address for s in res])
+        with patch("builtins.input", side_effect=make_input_side_effect(["", "q"])), patch("builtins.print") as out:
+            self.assertEqual(paginate(self.app.iter_course_report("DATA200"), 100), 200)
+        self.assertEqual(out.call_count, 200)
+        with patch("builtins.input", side_effect=make_input_side_effect([])):
+            self.assertEqual(paginate(iter(["a", "b"]), 2), 2)
+        prof = LoginUser("prof@mycsu.edu", "", "professor")
+        total = self.app.course_index.count("DATA200")
+        with patch("builtins.input", side_effect=make_input_side_effect(["14", "email", "asc", "DATA200", "0", "13", "r1", "0", "17", "16"])), \
+                patch("builtins.print") as out:
+            professor_menu(self.app, prof)
+        printed = [str(c.args[0]) for c in out.call_args_list if c.args]
+        self.assertTrue(any(p.startswith(f"Showing 1-{total} of {total} records") for p in printed))
+        self.assertTrue(any(p.startswith(f"Found {len(res)} student(s) in ") for p in printed))
+        self.assertIn(self.app.report_analytics(), printed)
+        path = os.path.join(self.tmpdir.name, "course.txt")
+        n = write_lines(self.app.iter_course_report("DATA200"), path)
+        with open(path) as f:
+            self.assertEqual(f.read(), self.app.report_course_full("DATA200") + "\n")
+        self.assertEqual(n, self.app.course_index.count("DATA200") + 2)
+
+    def test_integrity_checker_and_delete_rules(self):
+        self.assertTrue(self.app.integrity.ok, list(self.app.integrity.lines()))
+        self.assertIn("mick@sjsu.edu", self.app.professors)
+        self.assertIn("dean@sjsu.edu", self.app.students)
+        self.app.students["x1@x.com"] = Student("x1@x.com", "X", "O", "GONE1", "A", 85)
+        self.app.students["alias@x.com"] = Student("dean@sjsu.edu", "Dean", "Carpenter", "DATA200", "A+", 96)
+        self.app.professors["k@x.com"] = Professor("other@x.com", "K", "Prof", "GONE2")
+        self.app.users["s@x.com"] = LoginUser("s@x.com", "h", "student")
+        report = self.app.check_integrity()
+        self.assertEqual(sorted(o[:2] for o in report.orphans), [("professors", "k@x.com"), ("students", "x1@x.com"), ("users", "s@x.com")])
+        self.assertEqual(sorted(report.mismatches), [("professors", "k@x.com", "other@x.com"), ("students", "alias@x.com", "dean@sjsu.edu")])
+        self.assertEqual(report.duplicates, [("students", "dean@sjsu.edu", ["dean@sjsu.edu", "alias@x.com"])])
+        self.assertIn("3 orphan(s)", report.summary())
+        self.app.strict_integrity = True
+        with self.assertRaises(IntegrityError):
+            with self.app.batch():
+                self.app.students["x2@x.com"] = Student("x2@x.com", "X", "T", "DATA200", "A", 85)
+        self.assertNotIn("x2@x.com", self.app.students)
+        for k in ("x1@x.com", "alias@x.com"):
+            del self.app.students[k]
+        del self.app.professors["k@x.com"], self.app.users["s@x.com"]
+        with self.app.batch():
+            self.app.students["x2@x.com"] = Student("x2@x.com", "X", "T", "DATA200", "A", 85)
+        self.assertTrue(self.app.integrity.ok)
+        with self.assertRaises(IntegrityError):
+            self.app.drop_course("DATA200", "restrict")
+        self.assertIn("DATA200", self.app.courses)
+        self.assertTrue(self.app.drop_course("DATA200", "cascade"))
+        self.assertEqual(self.app.course_index.count("DATA200"), 0)
+        self.assertNotIn("mick@sjsu.edu", self.app.professors)
+        self.assertFalse(self.app.drop_course("DATA200"))
+        reloaded = CheckMyGradeApp(self.tmpdir.name)
+        self.assertNotIn("dean@sjsu.edu", reloaded.students)
+        self.assertTrue(reloaded.integrity.ok, list(reloaded.integrity.lines()))
+
+    def test_compressed_csv_stores_stream_and_round_trip(self):
+        for i in range(300):
+            self.app.students[f"z{i}@x.com"] = Student(f"z{i}@x.com", "Z", "C", "DATA200", "B", 75)
+        self.app.save_students()
+        plain = os.path.getsize(os.path.join(self.tmpdir.name, "Student.csv"))
+        with patch("builtins.print"):
+            fallback = CheckMyGradeApp(self.tmpdir.name, compression="gzip")
+        self.assertEqual(sorted(fallback.students), sorted(self.app.students))
+        self.assertIn("prof@mycsu.edu", fallback.users)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, "Student.csv.gz")))
+        counts = convert_csv_compression(self.tmpdir.name, "gzip")
+        self.assertEqual(counts["students"], len(self.app.students))
+        gz = os.path.join(self.tmpdir.name, "Student.csv.gz")
+        with open(gz, "rb") as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+        self.assertLess(os.path.getsize(gz) * 3, plain)
+        app = CheckMyGradeApp(self.tmpdir.name, compression="gzip", load_workers=4)
+        self.assertEqual(sorted(app.students), sorted(self.app.students))
+        app.put_record("students", {"Email_address": "j@x.com", "First_name": "J", "Last_name": "R", "Course_id": "DATA200", "grades": "A", "Marks": "88"})
+        with open(gz + ".journal") as f:
+            self.assertTrue(f.readline().startswith("_op,"))
+        with patch.object(CSVstore, "PARALLEL_MIN_BYTES", 0), patch.object(CSVstore, "_iter_parallel") as par:
+            again = CheckMyGradeApp(self.tmpdir.name, compression="gzip", load_workers=4)
+        par.assert_not_called()
+        self.assertIn("j@x.com", again.students)
+        again.save_students()
+        self.assertFalse(os.path.exists(gz + ".journal"))
+        xz = CSVstore(os.path.join(self.tmpdir.name, "Roster.csv.xz"), ["Email_address", "Marks"])
+        self.assertEqual(xz.compression, "lzma")
+        xz.write_all({"Email_address": f"x{i}", "Marks": i} for i in range(50))
+        xz.delete("x3")
+        self.assertEqual(len(CSVstore(xz.path, xz.headers).read_all()), 49)
+        with open(xz.path, "rb") as f:
+            self.assertEqual(f.read(6), b"\xfd7zXZ\x00")
+
+    def test_lazy_per_store_loading(self):
+        for i in range(50):
+            self.app.students[f"y{i}@x.com"] = Student(f"y{i}@x.com", "Y", "L", "DATA200", "B", 70 + i % 20)
+        self.app.save_students()
+        self.app.register_user("y7@x.com", "pw", "student")
+        self.app.put_record("students", {"Email_address": "y7@x.com", "First_name": "Yan", "Last_name": "L", "Course_id": "DATA200", "grades": "A", "Marks": "88"})
+        self.app.drop_record("students", "y8@x.com")
+        app = CheckMyGradeApp(self.tmpdir.name)
+        self.assertFalse(any(app.loaded(n) for n in ("students", "courses", "professors", "users")))
+        with patch.object(app.students_store, "read_all") as full_read:
+            user = app.login("y7@x.com", "pw")
+            self.assertEqual(app.report_student(user.User_id), self.app.report_student("y7@x.com"))
+            self.assertEqual(app.report_student("y8@x.com"), "No record.")
+        full_read.assert_not_called()
+        self.assertTrue(app.loaded("users"))
+        self.assertFalse(app.loaded("students") or app.loaded("courses") or app.loaded("professors"))
+        self.assertEqual(app.course_index.count("DATA200"), self.app.course_index.count("DATA200"))
+        self.assertTrue(app.loaded("students"))
+        self.assertEqual(app.lookup("students", "y7@x.com").Marks, 88)
+        lazy = CheckMyGradeApp(self.tmpdir.name)
+        with self.assertRaises(RuntimeError):
+            with lazy.batch():
+                lazy.students["tmp@x.com"] = Student("tmp@x.com", "T", "M", "DATA200", "A", 85)
+                raise RuntimeError("abort")
+        self.assertFalse(lazy.loaded("students"))
+        self.assertNotIn("tmp@x.com", lazy.students)
+        self.assertTrue(lazy.integrity.ok, list(lazy.integrity.lines()))
+        self.assertTrue(all(lazy.loaded(n) for n in ("students", "courses", "professors", "users")))
+        with open(self.app.students_store.path, "a", newline="") as f:
+            f.write("y3@x.com,Dup,L,DATA200,A,91\r\n")
+        fresh = CheckMyGradeApp(self.tmpdir.name)
+        self.assertEqual(fresh.lookup("students", "y3@x.com").First_name, "Dup")
+        self.assertEqual(fresh.report_student("y3@x.com"), CheckMyGradeApp(self.tmpdir.name, lazy=False).report_student("y3@x.com"))
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
 